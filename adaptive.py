@@ -0,0 +1,198 @@
+"""Adaptive question selection for paid and study papers.
+
+A question's weight is its difficulty weight times a boost for how often the
+candidate has missed it:
+
+    weight = (1 + DIFFICULTY_WEIGHT * miss_rate) * (1 + MISS_BOOST * misses)
+
+The difficulty part is shared by every candidate. It comes from the
+`question_stats` aggregates and is kept per course in a Fenwick tree that is
+rebuilt when the bank changes or after STATS_TTL seconds. The personal part
+comes from the `user_weakness` index, which /submit keeps up to date and
+which holds only the questions a candidate currently gets wrong. It lives in
+a small per-request tree. A draw picks the personal component with
+probability proportional to its share of the remaining weight, otherwise it
+descends the shared tree. A chosen question's personal weight is removed,
+and a repeat from the shared tree is rejected and redrawn. Each draw costs
+O(log n), so a paper of k questions costs O(k log n) after the first build.
+"""
+import bisect
+import random
+import secrets
+import threading
+import time
+
+# How much a question everyone gets wrong outweighs one everyone gets right
+DIFFICULTY_WEIGHT = 2.0
+# Extra weight per outstanding miss by this candidate, counting at most MAX_MISSES misses
+MISS_BOOST = 3.0
+MAX_MISSES = 5
+# Most-missed questions considered per candidate and course
+MAX_WEAK_QUESTIONS = 200
+STATS_TTL = 300
+# Past this share of the course, fall back to a single weighted pass over it
+REJECTION_LIMIT = 0.5
+
+
+class FenwickTree:
+    """Prefix sums over float weights with O(log n) update and weighted lookup."""
+
+    def __init__(self, weights):
+        n = len(weights)
+        tree = [0.0] + list(weights)
+        for i in range(1, n + 1):
+            parent = i + (i & -i)
+            if parent <= n:
+                tree[parent] += tree[i]
+        self._tree = tree
+        self._size = n
+        self._top = 1 << n.bit_length() if n else 0
+        self.total = sum(weights)
+
+    def add(self, index, delta):
+        """Add `delta` to the weight at `index`."""
+        i = index + 1
+        while i <= self._size:
+            self._tree[i] += delta
+            i += i & -i
+        self.total += delta
+
+    def find(self, target):
+        """Return the index whose cumulative weight range contains `target` (0 <= target < total)."""
+        pos = 0
+        step = self._top
+        tree = self._tree
+        while step:
+            nxt = pos + step
+            if nxt <= self._size and tree[nxt] <= target:
+                pos = nxt
+                target -= tree[nxt]
+            step >>= 1
+        return min(pos, self._size - 1)
+
+
+def difficulty_weight(attempts, correct):
+    # Laplace smoothing keeps rarely answered questions near the middle
+    miss_rate = 1 - (correct + 1) / (attempts + 2)
+    return 1 + DIFFICULTY_WEIGHT * miss_rate
+
+
+class DifficultyIndex:
+    """Per-course Fenwick trees of difficulty weights, shared by all candidates."""
+
+    def __init__(self, ttl=STATS_TTL):
+        self.ttl = ttl
+        self._courses = {}
+        self._lock = threading.Lock()
+
+    def get(self, conn, course, questions):
+        """Return (weights, tree) for a course tuple from the question bank.
+
+        The tree is only read after it is built, so concurrent requests can
+        share it without locking.
+        """
+        entry = self._courses.get(course)
+        if entry is not None and entry[0] is questions and time.monotonic() - entry[1] < self.ttl:
+            return entry[2], entry[3]
+        stats = {row[0]: (row[1], row[2]) for row in conn.execute('''
+            SELECT s.question_id, s.attempts, s.correct
+            FROM question_stats s JOIN questions q ON q.id = s.question_id
+            WHERE q.course_code = ?
+        ''', (course,))}
+        weights = [difficulty_weight(*stats.get(q.id, (0, 0))) for q in questions]
+        tree = FenwickTree(weights)
+        with self._lock:
+            self._courses[course] = (questions, time.monotonic(), weights, tree)
+        return weights, tree
+
+
+difficulty_index = DifficultyIndex()
+
+
+def user_misses(conn, user_id, course):
+    """Return {question_id: misses} for the candidate's most-missed questions in a course."""
+    rows = conn.execute('''
+        SELECT question_id, misses FROM user_weakness
+        WHERE user_id = ? AND course_code = ? AND misses > 0
+        ORDER BY misses DESC LIMIT ?
+    ''', (user_id, course, MAX_WEAK_QUESTIONS))
+    return dict(rows.fetchall())
+
+
+def update_weakness(conn, user_id, course, results):
+    """Record a submitted paper in the weakness index (the caller commits).
+
+    `results` are (question_id, correct) pairs. A miss, including a skipped
+    question, adds one; a correct answer works one off.
+    """
+    missed = [(user_id, course, question_id) for question_id, correct in results if not correct]
+    solved = [(user_id, course, question_id) for question_id, correct in results if correct]
+    conn.executemany('''
+        INSERT INTO user_weakness (user_id, course_code, question_id, misses) VALUES (?, ?, ?, 1)
+        ON CONFLICT (user_id, course_code, question_id) DO UPDATE SET misses = misses + 1
+    ''', missed)
+    conn.executemany('''
+        UPDATE user_weakness SET misses = misses - 1
+        WHERE user_id = ? AND course_code = ? AND question_id = ?
+    ''', solved)
+    if solved:
+        conn.execute('DELETE FROM user_weakness WHERE user_id = ? AND course_code = ? AND misses <= 0',
+                     (user_id, course))
+
+
+def _position(questions, question_id):
+    """Index of a question id in a course ordered by id, or None."""
+    i = bisect.bisect_left(questions, question_id, key=lambda q: q.id)
+    return i if i < len(questions) and questions[i].id == question_id else None
+
+
+def sample_adaptive(conn, user_id, course, questions, limit=None, seed=None):
+    """Return (seed, questions) drawn by difficulty and the candidate's misses.
+
+    `questions` is a course from the question bank, ordered by id. As with
+    `sample_paper`, passing the returned seed back in reproduces the draw
+    while the stats and the candidate's misses are unchanged.
+    """
+    if seed is None:
+        seed = secrets.randbits(32)
+    rng = random.Random(seed)
+    n = len(questions)
+    k = n if not limit or limit < 0 else min(limit, n)
+    if k == 0:
+        return seed, []
+    weights, tree = difficulty_index.get(conn, course, questions)
+
+    # Positions in the course and boost weights of the candidate's missed questions
+    boosted, extras = [], []
+    for question_id, misses in sorted(user_misses(conn, user_id, course).items()):
+        i = _position(questions, question_id)
+        if i is not None:
+            boosted.append(i)
+            extras.append(weights[i] * MISS_BOOST * min(misses, MAX_MISSES))
+
+    if k > n * REJECTION_LIMIT:
+        # Near-full papers: one Efraimidis-Spirakis pass beats many rejected draws
+        combined = list(weights)
+        for i, extra in zip(boosted, extras):
+            combined[i] += extra
+        order = sorted(range(n), key=lambda i: rng.random() ** (1 / combined[i]), reverse=True)
+        return seed, [questions[i] for i in order[:k]]
+
+    slot = {i: j for j, i in enumerate(boosted)}
+    personal = FenwickTree(extras)
+    chosen, picked = set(), []
+    while len(picked) < k:
+        boost_total = max(personal.total, 0.0)
+        r = rng.random() * (tree.total + boost_total)
+        if r < boost_total:
+            i = boosted[personal.find(r)]
+        else:
+            i = tree.find(r - boost_total)
+        if i in chosen:
+            continue
+        chosen.add(i)
+        picked.append(questions[i])
+        j = slot.get(i)
+        if j is not None:
+            personal.add(j, -extras[j])
+    return seed, picked
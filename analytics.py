@@ -0,0 +1,129 @@
+"""Per-question answer analytics.
+
+`/submit` appends one row per answered (or skipped) question to the
+append-only `answer_events` log, in the same transaction as the attempt.
+`aggregate()` folds events past a stored watermark into `question_stats`:
+per-question attempt and correct counts and an option histogram. It only
+ever reads new events, so the admin view stays cheap as the log grows. It
+runs incrementally before the admin view reads the aggregates, and can also
+be scheduled with `python analytics.py`. The scheduled run also prunes
+events that have been aggregated and are older than EVENT_RETENTION_DAYS,
+and purges abandoned attempts and spent checkpoints (`attempts.purge_stale`).
+"""
+import argparse
+import sqlite3
+from collections import defaultdict
+
+from attempts import purge_stale
+from config import DB_PATH
+
+AGGREGATOR = 'question_stats'
+BATCH_SIZE = 5000
+OPTIONS = ('A', 'B', 'C', 'D')
+EVENT_RETENTION_DAYS = 180
+
+
+def record_answers(conn, attempt_id, events):
+    """Append (question_id, answer, correct) events for a submitted attempt (the caller commits)."""
+    conn.executemany('INSERT INTO answer_events (attempt_id, question_id, answer, correct) VALUES (?, ?, ?, ?)',
+                     [(attempt_id, question_id, answer, int(correct)) for question_id, answer, correct in events])
+
+
+def aggregate(conn, batch_size=BATCH_SIZE):
+    """Fold events past the watermark into question_stats and return how many were applied."""
+    applied = 0
+    while True:
+        # IMMEDIATE takes the write lock before reading the watermark, so two
+        # workers aggregating at once cannot apply the same events twice
+        conn.commit()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT last_event_id FROM aggregator_state WHERE name = ?', (AGGREGATOR,)).fetchone()
+            watermark = row[0] if row else 0
+            events = conn.execute('''
+                SELECT id, question_id, answer, correct FROM answer_events
+                WHERE id > ? ORDER BY id LIMIT ?
+            ''', (watermark, batch_size)).fetchall()
+            if not events:
+                conn.rollback()
+                return applied
+
+            totals = defaultdict(lambda: [0, 0, 0, 0, 0, 0, 0])
+            for _, question_id, answer, correct in events:
+                stats = totals[question_id]
+                stats[0] += 1
+                stats[1] += correct
+                if answer in OPTIONS:
+                    stats[2 + OPTIONS.index(answer)] += 1
+                else:
+                    stats[6] += 1
+            conn.executemany('''
+                INSERT INTO question_stats (question_id, attempts, correct, option_a, option_b, option_c, option_d, skipped)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (question_id) DO UPDATE SET
+                    attempts = attempts + excluded.attempts,
+                    correct = correct + excluded.correct,
+                    option_a = option_a + excluded.option_a,
+                    option_b = option_b + excluded.option_b,
+                    option_c = option_c + excluded.option_c,
+                    option_d = option_d + excluded.option_d,
+                    skipped = skipped + excluded.skipped
+            ''', [(question_id, *stats) for question_id, stats in totals.items()])
+            conn.execute('''
+                INSERT INTO aggregator_state (name, last_event_id) VALUES (?, ?)
+                ON CONFLICT (name) DO UPDATE SET last_event_id = excluded.last_event_id
+            ''', (AGGREGATOR, events[-1][0]))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied += len(events)
+        if len(events) < batch_size:
+            return applied
+
+
+def prune_events(conn, retention_days=EVENT_RETENTION_DAYS):
+    """Delete aggregated events older than the retention window and return how many were removed."""
+    row = conn.execute('SELECT last_event_id FROM aggregator_state WHERE name = ?', (AGGREGATOR,)).fetchone()
+    if not row:
+        return 0
+    deleted = conn.execute('''
+        DELETE FROM answer_events WHERE id <= ? AND created_at < datetime('now', ?)
+    ''', (row[0], f'-{int(retention_days)} days')).rowcount
+    conn.commit()
+    return deleted
+
+
+def hardest_questions(conn, course=None, min_attempts=5, limit=50):
+    """Questions with the lowest correct rate, with their option histograms."""
+    conditions, params = ['s.attempts >= ?'], [min_attempts]
+    if course:
+        conditions.append('q.course_code = ?')
+        params.append(course)
+    rows = conn.execute(f'''
+        SELECT s.*, q.course_code, q.question_text, q.correct_option,
+               CAST(s.correct AS REAL) / s.attempts AS correct_rate
+        FROM question_stats s JOIN questions q ON q.id = s.question_id
+        WHERE {' AND '.join(conditions)}
+        ORDER BY correct_rate, s.attempts DESC LIMIT ?
+    ''', params + [limit])
+    return [dict(row) for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fold new answer events into the per-question aggregates '
+                                                 'and purge data past its retention window.')
+    parser.add_argument('--db', default=DB_PATH, help='path to the SQLite database')
+    parser.add_argument('--event-retention-days', type=int, default=EVENT_RETENTION_DAYS,
+                        help='keep aggregated answer events this long')
+    args = parser.parse_args()
+    conn = sqlite3.connect(args.db)
+    print(f'Applied {aggregate(conn)} answer events.')
+    print(f'Pruned {prune_events(conn, args.event_retention_days)} aggregated answer events.')
+    attempts, checkpoints = purge_stale(conn)
+    print(f'Purged {attempts} abandoned attempts and {checkpoints} checkpoints.')
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,37 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify, session, flash
+from flask import Flask, render_template, request, redirect, url_for, jsonify, session, flash, g
 import sqlite3
 import os
-import requests
+import json
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
 from functools import wraps
 from init_db import init_db
+from migrations import SCHEMA_VERSION
+import analytics
+import assets
+import db
+import images
+import metrics
+import search
+from metrics import track_external
+from db import get_db
+from sampler import sample_paper
+from question_bank import question_bank
+from paystack import PaystackClient, PaystackError, PAYSTACK_BASE_URL
+from render_cache import cached_page
+from analytics import record_answers
+from adaptive import sample_adaptive, update_weakness
+import sittings
+from attempts import (create_attempt, load_attempt, record_paper, finish_attempt, save_progress,
+                      load_progress, assemble_answers, deadline_after, is_late, open_attempt, attempt_config,
+                      abandon_attempt, in_sitting)
 from authlib.integrations.flask_client import OAuth
 from dotenv import load_dotenv
 from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
 
 # Load environment variables
 # Check for key.env first, then fallback to .env
@@ -18,15 +42,16 @@ else:
 
 app = Flask(__name__)
 app.secret_key = os.getenv('SECRET_KEY', 'supersecretkey')
-
-# Initialize database
-init_db()
+assets.init_app(app)
 
 # Upload configuration
 UPLOAD_FOLDER = os.path.join('static', 'uploads')
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Werkzeug rejects bodies past this before parsing; images.py enforces the exact cap
+app.config['MAX_CONTENT_LENGTH'] = images.MAX_UPLOAD_BYTES + 64 * 1024
 os.makedirs(os.path.join(app.root_path, UPLOAD_FOLDER), exist_ok=True)
+images.init_app(app, os.path.join(app.root_path, UPLOAD_FOLDER))
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -50,15 +75,50 @@ google = oauth.register(
 # Paystack Configuration
 PAYSTACK_SECRET_KEY = os.getenv('PAYSTACK_SECRET_KEY')
 PAYSTACK_PUBLIC_KEY = os.getenv('PAYSTACK_PUBLIC_KEY')
+# PAYSTACK_BASE_URL can point verification at a local stub server
+paystack_client = PaystackClient(PAYSTACK_SECRET_KEY, os.getenv('PAYSTACK_BASE_URL', PAYSTACK_BASE_URL))
+
+# Database connections are pooled per worker and bound to the app context
+db.init_app(app)
+
+# Per-request timing and /metrics, enabled with METRICS_ENABLED=1
+def cache_metrics():
+    stats = question_bank.stats()
+    return [
+        ('cbt_question_bank_cache_hits_total', 'counter', 'Question bank cache hits.', stats['hits']),
+        ('cbt_question_bank_cache_misses_total', 'counter', 'Question bank cache misses.', stats['misses']),
+        ('cbt_question_bank_cached_questions', 'gauge', 'Questions held in the question bank cache.', stats['questions']),
+    ]
+
+metrics.init_app(app, extra_metrics=cache_metrics)
+
+# ==================== Payment Entitlement ====================
+
+# How long a paid status is trusted before re-checking the database
+ENTITLEMENT_TTL = 600
+
+def has_paid():
+    """Return whether the logged-in user has paid, caching a paid result in the session for ENTITLEMENT_TTL.
+
+    Unpaid is never cached, so a payment verified in another browser or on
+    another device takes effect on the next request.
+    """
+    user_id = session['user_id']
+    cached = session.get('entitlement')
+    if (cached and cached['user_id'] == user_id and cached['paid']
+            and time.time() - cached['checked_at'] < ENTITLEMENT_TTL):
+        return True
+    cursor = get_db().execute('SELECT status FROM payments WHERE user_id = ? AND status = "paid"', (user_id,))
+    paid = cursor.fetchone() is not None
+    if paid:
+        session['entitlement'] = {'user_id': user_id, 'paid': True, 'checked_at': time.time()}
+    else:
+        session.pop('entitlement', None)
+    return paid
 
-# Database path
-DB_PATH = os.path.join(os.path.dirname(__file__), 'database', 'quiz.db')
-
-def get_db_connection():
-    """Create a database connection and return it."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+def grant_entitlement():
+    """Mark the logged-in user as paid right after a verified payment."""
+    session['entitlement'] = {'user_id': session['user_id'], 'paid': True, 'checked_at': time.time()}
 
 # ==================== Auth Decorators ====================
 
@@ -77,22 +137,32 @@ def payment_required(f):
         if 'user_id' not in session:
             return redirect(url_for('login', next=request.url))
         
-        # Check if user has paid
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT status FROM payments WHERE user_id = ? AND status = "paid"', (session['user_id'],))
-        payment = cursor.fetchone()
-        conn.close()
-        
-        if not payment:
+        if not has_paid():
             flash('Please pay ₦500 to access the Paid Simulator.')
             return redirect(url_for('payment'))
         return f(*args, **kwargs)
     return decorated_function
 
+def is_admin():
+    if 'user_id' not in session:
+        return False
+    row = get_db().execute('SELECT status FROM users WHERE id = ?', (session['user_id'],)).fetchone()
+    return row is not None and row['status'] == 'Admin'
+
+def admin_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'user_id' not in session:
+            return redirect(url_for('login', next=request.url))
+        if not is_admin():
+            return render_template('error.html', message='Admins only'), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
 # ==================== Routes ====================
 
 @app.route('/')
+@cached_page
 def index():
     """Home page route."""
     return render_template('index.html')
@@ -113,7 +183,7 @@ def register():
         
         hashed_password = generate_password_hash(password)
         
-        conn = get_db_connection()
+        conn = get_db()
         cursor = conn.cursor()
         try:
             cursor.execute('INSERT INTO users (username, email, password) VALUES (?, ?, ?)', 
@@ -123,8 +193,6 @@ def register():
             return redirect(url_for('login'))
         except sqlite3.IntegrityError:
             flash('Email already exists.')
-        finally:
-            conn.close()
             
     return render_template('register.html')
 
@@ -137,11 +205,10 @@ def login():
         email = request.form.get('email')
         password = request.form.get('password')
         
-        conn = get_db_connection()
+        conn = get_db()
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM users WHERE email = ?', (email,))
         user = cursor.fetchone()
-        conn.close()
         
         if user and user['password'] and check_password_hash(user['password'], password):
             session['user_id'] = user['id']
@@ -167,14 +234,15 @@ def login_google():
 @app.route('/authorize')
 def authorize():
     try:
-        token = google.authorize_access_token()
-        resp = google.get('userinfo')
-        user_info = resp.json()
+        with track_external('google'):
+            token = google.authorize_access_token()
+            resp = google.get('userinfo')
+            user_info = resp.json()
         
         email = user_info['email']
         username = user_info.get('name', email.split('@')[0])
         
-        conn = get_db_connection()
+        conn = get_db()
         cursor = conn.cursor()
         
         # Check if user exists
@@ -188,8 +256,6 @@ def authorize():
             cursor.execute('SELECT * FROM users WHERE email = ?', (email,))
             user = cursor.fetchone()
         
-        conn.close()
-        
         session['user_id'] = user['id']
         session['username'] = user['username']
         session['email'] = user['email']
@@ -208,34 +274,39 @@ def logout():
 @app.route('/profile')
 @login_required
 def profile():
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute('SELECT * FROM users WHERE id = ?', (session['user_id'],))
     user = cursor.fetchone()
-    conn.close()
     return render_template('profile.html', user=user)
 
 @app.route('/upload-profile-picture', methods=['POST'])
 @login_required
 def upload_profile_picture():
-    if 'profile_pic' not in request.files:
+    try:
+        file = request.files.get('profile_pic')
+    except RequestEntityTooLarge:
+        flash(f'Image is larger than {images.MAX_UPLOAD_BYTES // (1024 * 1024)} MB.')
+        return redirect(url_for('profile'))
+    if file is None:
         flash('No file part')
         return redirect(url_for('profile'))
     
-    file = request.files['profile_pic']
     if file.filename == '':
         flash('No selected file')
         return redirect(url_for('profile'))
     
     if file and allowed_file(file.filename):
-        filename = secure_filename(f"user_{session['user_id']}_{file.filename}")
-        file.save(os.path.join(app.root_path, app.config['UPLOAD_FOLDER'], filename))
+        try:
+            key = images.process_upload(file.stream, os.path.join(app.root_path, app.config['UPLOAD_FOLDER']))
+        except images.ImageError as e:
+            flash(str(e))
+            return redirect(url_for('profile'))
         
-        conn = get_db_connection()
+        conn = get_db()
         cursor = conn.cursor()
-        cursor.execute('UPDATE users SET profile_picture = ? WHERE id = ?', (filename, session['user_id']))
+        cursor.execute('UPDATE users SET profile_picture = ? WHERE id = ?', (key, session['user_id']))
         conn.commit()
-        conn.close()
         
         flash('Profile picture updated!')
     else:
@@ -248,29 +319,45 @@ def upload_profile_picture():
 def send_feedback():
     message = request.form.get('message')
     if message:
-        conn = get_db_connection()
+        conn = get_db()
         cursor = conn.cursor()
         cursor.execute('INSERT INTO feedback (user_id, message) VALUES (?, ?)', (session['user_id'], message))
         conn.commit()
-        conn.close()
         flash('Thank you for your feedback!')
     return redirect(url_for('profile'))
 
-@app.route('/leaderboard')
-def leaderboard():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    # Get top 10 scores with usernames
-    cursor.execute('''
+# Time windows offered on the leaderboard, as SQLite datetime() modifiers
+LEADERBOARD_WINDOWS = {'week': '-7 days', 'month': '-30 days'}
+
+def get_leaderboard(course=None, window=None, limit=10):
+    """Top scores read from the materialized ratio index, optionally per course and time window."""
+    conditions, params = [], []
+    if course:
+        conditions.append('s.course_code = ?')
+        params.append(course)
+    if window in LEADERBOARD_WINDOWS:
+        conditions.append("s.created_at >= datetime('now', ?)")
+        params.append(LEADERBOARD_WINDOWS[window])
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    params.append(limit)
+    cursor = get_db().execute(f'''
         SELECT s.*, u.username 
         FROM scores s 
         JOIN users u ON s.user_id = u.id 
-        ORDER BY (CAST(s.score AS FLOAT) / s.total) DESC, s.created_at DESC 
-        LIMIT 10
-    ''')
-    top_scores = cursor.fetchall()
-    conn.close()
-    return render_template('leaderboard.html', top_scores=top_scores)
+        {where}
+        ORDER BY s.ratio DESC, s.created_at DESC 
+        LIMIT ?
+    ''', params)
+    return cursor.fetchall()
+
+@app.route('/leaderboard')
+def leaderboard():
+    course = request.args.get('course', None)
+    window = request.args.get('window', None)
+    if window not in LEADERBOARD_WINDOWS:
+        window = None
+    top_scores = get_leaderboard(course, window)
+    return render_template('leaderboard.html', top_scores=top_scores, course=course, window=window)
 
 @app.route('/payment', methods=['GET'])
 @login_required
@@ -283,13 +370,18 @@ def verify_payment(reference):
     if not PAYSTACK_SECRET_KEY or PAYSTACK_SECRET_KEY == 'your_paystack_secret_key':
         return jsonify({'status': 'failed', 'message': 'Paystack Secret Key is not configured.'}), 500
 
-    url = f"https://api.paystack.co/transaction/verify/{reference}"
-    headers = {
-        "Authorization": f"Bearer {PAYSTACK_SECRET_KEY}"
-    }
+    # A reference that is already recorded is a cheap no-op, not a second gateway call
+    conn = get_db()
+    existing = conn.execute('SELECT user_id FROM payments WHERE reference = ?', (reference,)).fetchone()
+    if existing:
+        if existing['user_id'] != session['user_id']:
+            return jsonify({'status': 'failed', 'message': 'This payment reference has already been used.'}), 400
+        grant_entitlement()
+        return jsonify({'status': 'success'})
+
     try:
-        response = requests.get(url, headers=headers)
-        res_data = response.json()
+        with track_external('paystack'):
+            res_data = paystack_client.verify_transaction(reference)
         
         if not res_data.get('status'):
             return jsonify({'status': 'failed', 'message': res_data.get('message', 'Verification failed')}), 400
@@ -297,32 +389,42 @@ def verify_payment(reference):
         if res_data['data']['status'] == 'success':
             amount = res_data['data']['amount'] / 100  # Paystack returns in kobo
             
-            conn = get_db_connection()
+            # The UNIQUE reference turns a concurrent duplicate verification into a no-op
             cursor = conn.cursor()
-            cursor.execute('INSERT INTO payments (user_id, amount, status, reference) VALUES (?, ?, ?, ?)', 
+            cursor.execute('''INSERT INTO payments (user_id, amount, status, reference) VALUES (?, ?, ?, ?)
+                              ON CONFLICT (reference) DO NOTHING''', 
                            (session['user_id'], amount, 'paid', reference))
             conn.commit()
-            conn.close()
+            if cursor.rowcount == 0:
+                owner = conn.execute('SELECT user_id FROM payments WHERE reference = ?', (reference,)).fetchone()
+                if owner['user_id'] != session['user_id']:
+                    return jsonify({'status': 'failed', 'message': 'This payment reference has already been used.'}), 400
+            grant_entitlement()
             
             flash('Payment successful! You now have access to the Paid Simulator.')
             return jsonify({'status': 'success'})
         else:
             return jsonify({'status': 'failed', 'message': 'Payment was not successful.'}), 400
+    except PaystackError as e:
+        return jsonify({'status': 'failed', 'message': str(e)}), 502
     except Exception as e:
         return jsonify({'status': 'failed', 'message': str(e)}), 500
 
 @app.route('/free-courses')
+@cached_page
 def free_courses():
     """Course selection page for free questions."""
     return render_template('courses.html')
 
 @app.route('/paid-courses')
 @payment_required
+@cached_page
 def paid_courses():
     """Course selection page for paid simulator."""
     return render_template('paid_courses.html')
 
 @app.route('/study-courses')
+@cached_page
 def study_courses():
     """Course selection page for study questions."""
     return render_template('study_courses.html')
@@ -336,12 +438,7 @@ def configure_test():
     if simulator == 'paid':
         if 'user_id' not in session:
             return redirect(url_for('login', next=request.url))
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT status FROM payments WHERE user_id = ? AND status = "paid"', (session['user_id'],))
-        payment = cursor.fetchone()
-        conn.close()
-        if not payment:
+        if not has_paid():
             return redirect(url_for('payment'))
 
     if not course:
@@ -359,12 +456,7 @@ def configure_test():
     }
     course_full_name = course_names.get(course, course)
     session['simulator_type'] = simulator
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT COUNT(*) FROM questions WHERE course_code = ?', (course,))
-    total_questions = cursor.fetchone()[0]
-    conn.close()
+    total_questions = question_bank.count(get_db(), course)
     
     return render_template('configure_test.html', course=course, course_full_name=course_full_name, simulator=simulator, total_questions=total_questions)
 
@@ -375,32 +467,82 @@ def quiz():
     duration_hours = request.args.get('hours', 0)
     duration_minutes = request.args.get('minutes', 10)
     simulator = request.args.get('simulator', 'free')
+    selection = 'adaptive' if request.args.get('selection') == 'adaptive' and simulator in ADAPTIVE_SIMULATORS else 'random'
     
     if simulator == 'paid':
         if 'user_id' not in session:
             return redirect(url_for('login', next=request.url))
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT status FROM payments WHERE user_id = ? AND status = "paid"', (session['user_id'],))
-        payment = cursor.fetchone()
-        conn.close()
-        if not payment:
+        if not has_paid():
             return redirect(url_for('payment'))
 
     if not course:
         return redirect(url_for('paid_courses' if simulator == 'paid' else 'free_courses'))
     
-    session['current_course'] = course
-    session['num_questions'] = int(num_questions)
-    session['duration_seconds'] = (int(duration_hours) * 3600) + (int(duration_minutes) * 60)
+    # Attempt state lives server-side; only its id goes into the session cookie
+    conn = get_db()
+    requested = (int(num_questions), (int(duration_hours) * 3600) + (int(duration_minutes) * 60), selection)
+    attempt = current_attempt()
+    if not resumable(attempt, course, simulator):
+        attempt = None
+        if 'user_id' in session and explicitly_timed(requested):
+            # The deadline of a timed test belongs to the user's attempt, not to this browser session
+            attempt = load_attempt(conn, open_attempt(conn, session['user_id'], course, simulator, requested))
+            if resumable(attempt, course, simulator):
+                session['attempt_id'] = attempt['id']
+            else:
+                attempt = None
+    args = request.args.to_dict()
+    if args.pop('restart', None):
+        if attempt:
+            abandon_attempt(conn, attempt['id'])
+        # Drop the flag so a reload continues the new attempt instead of restarting again
+        return redirect(url_for('quiz', **args))
+    if attempt and attempt_config(attempt) != requested and not args.get('resume'):
+        # A different paper was asked for; let the user decide rather than silently picking one
+        return render_template('resume_attempt.html', attempt=attempt,
+                               resume_url=url_for('quiz', course=course, simulator=simulator, resume=1),
+                               restart_url=url_for('quiz', **dict(args, restart=1)))
+    if attempt:
+        # A reload or reopened tab continues the same paper, answers and deadline
+        num_questions, duration_seconds, selection = attempt_config(attempt)
+        deadline = attempt['deadline']
+    else:
+        num_questions, duration_seconds, selection = requested
+        deadline = deadline_after(duration_seconds)
+        session['attempt_id'] = create_attempt(conn, session.get('user_id'), course, simulator, num_questions,
+                                               duration_seconds, deadline, selection)
     session['simulator_type'] = simulator
     
-    return render_template('study_questions.html' if simulator == 'study' else 'quiz.html', course=course)
+    return render_template('study_questions.html' if simulator == 'study' else 'quiz.html', course=course,
+                           num_questions=num_questions, duration_seconds=duration_seconds, deadline=deadline,
+                           selection=selection)
+
+def current_attempt():
+    """Load the session's attempt from the attempt store once per request."""
+    if 'attempt' not in g:
+        g.attempt = load_attempt(get_db(), session.get('attempt_id'))
+    return g.attempt
+
+def explicitly_timed(config):
+    """Whether /quiz was asked for a timed test, rather than falling back to the default duration."""
+    return config[1] > 0 and ('hours' in request.args or 'minutes' in request.args)
+
+def resumable(attempt, course, simulator):
+    """Whether /quiz may continue the session's attempt instead of starting a new one.
+
+    Study mode shows answers as it goes, so it always starts afresh; sitting
+    papers only open through their sitting.
+    """
+    return (attempt is not None and simulator != 'study' and not attempt['submitted_at']
+            and not attempt['abandoned_at'] and not is_late(attempt)
+            and attempt['course_code'] == course and attempt['simulator'] == simulator
+            and attempt['user_id'] == session.get('user_id') and not in_sitting(get_db(), attempt['id']))
 
 @app.route('/api/review-data')
 def get_review_data():
-    user_answers = session.get('user_answers', [])
-    course = session.get('current_course', 'Unknown')
+    attempt = current_attempt()
+    user_answers = attempt['answers'] if attempt else []
+    course = attempt['course_code'] if attempt else 'Unknown'
     review_data = get_detailed_results(user_answers, course)
     return jsonify(review_data)
 
@@ -409,11 +551,7 @@ def get_course_info():
     course = request.args.get('course', None)
     simulator = request.args.get('simulator', session.get('simulator_type', 'free'))
     if not course: return jsonify({'error': 'Course parameter required'}), 400
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT COUNT(*) FROM questions WHERE course_code = ?', (course,))
-    total_questions = cursor.fetchone()[0]
-    conn.close()
+    total_questions = question_bank.count(get_db(), course)
     if simulator == 'free':
         allowed_courses = ['MTH', 'CHM', 'PHY']
         if not any(course.startswith(prefix) for prefix in allowed_courses):
@@ -425,138 +563,415 @@ def get_course_info():
 def get_available_codes():
     subject = request.args.get('subject', None)
     if not subject: return jsonify({'error': 'Subject parameter required'}), 400
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT DISTINCT course_code FROM questions WHERE course_code LIKE ?', (f'{subject}%',))
-    codes = [row['course_code'] for row in cursor.fetchall()]
-    conn.close()
+    # Same case-insensitive prefix match as LIKE 'subject%', served from the cached code list
+    prefix = subject.lower()
+    codes = [code for code in question_bank.course_codes(get_db()) if code.lower().startswith(prefix)]
     return jsonify({'codes': codes})
 
+# Payload schemas for /api/questions, selected with ?format=
+QUESTION_FORMATS = {'objects', 'columns'}
+# Simulators that may request ?selection=adaptive
+ADAPTIVE_SIMULATORS = {'paid', 'study'}
+
+def paper_objects(questions, with_answers=False):
+    """Legacy payload: one object per question; answers and solutions only for study attempts."""
+    paper = []
+    for q in questions:
+        item = {
+            'id': q.id,
+            'question_text': q.question_text,
+            'option_a': q.option_a,
+            'option_b': q.option_b,
+            'option_c': q.option_c,
+            'option_d': q.option_d,
+        }
+        if with_answers:
+            item['correct_option'] = q.correct_option
+            item['solution'] = q.solution if q.solution else "No detailed solution available."
+        paper.append(item)
+    return paper
+
+def paper_columns(questions, seed):
+    """Compact payload: parallel arrays and no answers; study mode fetches solutions lazily."""
+    return {
+        'v': 2,
+        'seed': seed,
+        'id': [q.id for q in questions],
+        'text': [q.question_text for q in questions],
+        'options': [[q.option_a, q.option_b, q.option_c, q.option_d] for q in questions],
+    }
+
 @app.route('/api/questions', methods=['GET'])
 def get_questions():
     try:
         course = request.args.get('course', None)
         limit = request.args.get('limit', None)
+        fmt = request.args.get('format', 'objects')
+        selection = request.args.get('selection', 'random')
         simulator = session.get('simulator_type', 'free')
         if not course: return jsonify({'error': 'Course parameter required'}), 400
+        if fmt not in QUESTION_FORMATS: return jsonify({'error': 'Unknown format'}), 400
         if simulator == 'free':
             limit = min(int(limit), 10) if limit else 10
         elif limit:
             limit = int(limit)
             
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Always fetch all fields to avoid missing data in any mode
-        query = 'SELECT id, question_text, option_a, option_b, option_c, option_d, correct_option, solution FROM questions WHERE course_code = ? ORDER BY RANDOM()'
-        params = [course]
-        
-        if limit:
-            query += ' LIMIT ?'
-            params.append(limit)
-            
-        cursor.execute(query, tuple(params))
-        questions = cursor.fetchall()
-        conn.close()
+        seed = request.args.get('seed', None)
+        seed = int(seed) if seed else None
+
+        attempt = current_attempt()
+        if attempt and attempt['course_code'] != course:
+            return jsonify({'error': 'Course does not match the current attempt'}), 400
+        if attempt and attempt['question_ids']:
+            # The attempt's paper is fixed once drawn; a seed only chooses the first draw
+            seed = attempt['seed']
+            by_id = question_bank.get_many(get_db(), attempt['question_ids'])
+            questions = [by_id[i] for i in attempt['question_ids'] if i in by_id]
+        else:
+            # Draw the paper from the cached question bank; no disk access on a warm cache
+            course_questions = question_bank.course(get_db(), course)
+            if selection == 'adaptive' and simulator in ADAPTIVE_SIMULATORS and 'user_id' in session:
+                seed, questions = sample_adaptive(get_db(), session['user_id'], course, course_questions, limit, seed)
+            else:
+                seed, questions = sample_paper(course_questions, limit, seed)
+            if questions and attempt:
+                record_paper(get_db(), attempt['id'], seed, [q.id for q in questions])
         
         if not questions: return jsonify({'error': f'No questions found for course {course}'}), 404
         
-        questions_list = []
-        for q in questions:
-            item = {
-                'id': q['id'], 
-                'question_text': q['question_text'], 
-                'option_a': q['option_a'], 
-                'option_b': q['option_b'], 
-                'option_c': q['option_c'], 
-                'option_d': q['option_d'],
-                'correct_option': q['correct_option'],
-                'solution': q['solution'] if q['solution'] else "No detailed solution available."
-            }
-            questions_list.append(item)
-        return jsonify(questions_list)
+        if fmt == 'columns':
+            response = jsonify(paper_columns(questions, seed))
+        else:
+            response = jsonify(paper_objects(questions, with_answers=bool(attempt) and attempt['simulator'] == 'study'))
+        etag = hashlib.sha1(response.get_data()).hexdigest()
+        assets.compress_response(response)
+        response.set_etag(f'{etag}-{response.content_encoding}' if response.content_encoding else etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.headers['X-Question-Seed'] = str(seed)
+        return response.make_conditional(request)
     except Exception as e:
         return jsonify({'error': 'Failed to fetch questions'}), 500
 
+@app.route('/api/solution/<int:question_id>')
+def get_solution(question_id):
+    """Answer and worked solution for one question of the current study attempt."""
+    attempt = current_attempt()
+    if not attempt or attempt['simulator'] != 'study' or question_id not in attempt['question_ids']:
+        return jsonify({'error': 'Solutions are only available in study mode'}), 403
+    q = question_bank.get_many(get_db(), [question_id]).get(question_id)
+    if q is None: return jsonify({'error': 'Question not found'}), 404
+    response = jsonify({'id': q.id, 'correct_option': q.correct_option,
+                        'solution': q.solution if q.solution else "No detailed solution available."})
+    response.headers['Cache-Control'] = 'private, max-age=3600'
+    return response
+
+@app.route('/api/search')
+def search_questions():
+    """Paginated full-text search: admins over the whole bank, study mode within the studied course."""
+    admin = is_admin()
+    attempt = current_attempt()
+    if admin:
+        course = request.args.get('course') or None
+    elif attempt and attempt['simulator'] == 'study':
+        course = attempt['course_code']
+    else:
+        return jsonify({'error': 'Search is only available in study mode'}), 403
+    text = request.args.get('q', '')
+    if len(text) > 200: return jsonify({'error': 'Query too long'}), 400
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', search.PER_PAGE, type=int)
+    response = jsonify(search.search(get_db(), text, course, page, per_page, with_answers=admin))
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
 @app.route('/submit', methods=['POST'])
 def submit():
     try:
         data = request.get_json()
         answers = data.get('answers', [])
-        course = session.get('current_course', None)
-        if not course: return jsonify({'error': 'No course selected'}), 400
-        score = calculate_score(answers, course)
-        session['score'] = score
-        session['total'] = len(answers)
-        session['user_answers'] = answers
+        attempt = current_attempt()
+        if not attempt: return jsonify({'error': 'No course selected'}), 400
+        if attempt['submitted_at']: return jsonify({'score': attempt['score'], 'total': attempt['total']})
+        if attempt['abandoned_at']: return jsonify({'error': 'This attempt was started over'}), 409
+        course = attempt['course_code']
+        conn = get_db()
+        cursor = conn.cursor()
+        
+        # Past the deadline only what was checkpointed in time counts
+        late = is_late(attempt)
+        # Finalize from checkpointed progress; the request only carries answers not yet checkpointed
+        if attempt['question_ids']:
+            deltas = [] if late else answer_deltas(answers, attempt)
+            answers = assemble_answers(attempt, load_progress(conn, attempt['id']), deltas)
+        elif late:
+            answers = []
+        graded = grade_answers(answers)
+        score = graded['score']
+        finish_attempt(conn, attempt['id'], answers, score)
+        # Per-answer events for the question analytics, committed with the attempt
+        events = [(question_key(r['question_id']), r['answer'], r['correct']) for r in graded['results']]
+        events = [e for e in events if e[0] is not None]
+        record_answers(conn, attempt['id'], events)
+        if attempt['user_id'] is not None:
+            update_weakness(conn, attempt['user_id'], course, [(question_id, correct) for question_id, _, correct in events])
         
         # Save score to database if user is logged in
         if 'user_id' in session:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute('INSERT INTO scores (user_id, course_code, score, total) VALUES (?, ?, ?, ?)',
-                           (session['user_id'], course, score, len(answers)))
-            conn.commit()
-            conn.close()
+            ratio = score / len(answers) if answers else None
+            cursor.execute('INSERT INTO scores (user_id, course_code, score, total, ratio) VALUES (?, ?, ?, ?, ?)',
+                           (session['user_id'], course, score, len(answers), ratio))
+        conn.commit()
             
-        return jsonify({'score': score, 'total': len(answers)})
+        return jsonify({'score': score, 'total': len(answers), 'late': late})
     except Exception as e:
         return jsonify({'error': 'Failed to submit quiz'}), 500
 
+# Largest batch of answers accepted by one checkpoint
+CHECKPOINT_MAX_ANSWERS = 500
+VALID_ANSWERS = {'A', 'B', 'C', 'D', None}
+
+def answer_deltas(answers, attempt):
+    """Return (question_id, answer) pairs for answers that belong to the attempt's paper."""
+    paper = set(attempt['question_ids'])
+    deltas = []
+    for answer_data in answers:
+        question_id = question_key(answer_data.get('question_id'))
+        answer = answer_data.get('answer')
+        if question_id in paper and answer in VALID_ANSWERS:
+            deltas.append((question_id, answer))
+    return deltas
+
+@app.route('/api/time')
+def server_time():
+    """Server clock for exam timers; touches neither the session nor the database."""
+    response = jsonify({'now': time.time()})
+    response.headers['Cache-Control'] = 'public, max-age=1'
+    return response
+
+@app.route('/api/attempt/checkpoint', methods=['POST'])
+def checkpoint():
+    """Store a small batch of answer changes so the final submit only has to finalize."""
+    attempt = current_attempt()
+    if not attempt: return jsonify({'error': 'No active attempt'}), 400
+    if attempt['submitted_at']: return jsonify({'error': 'Attempt already submitted'}), 409
+    if attempt['abandoned_at']: return jsonify({'error': 'This attempt was started over'}), 409
+    if is_late(attempt): return jsonify({'error': 'Time is up'}), 409
+    data = request.get_json(silent=True) or {}
+    answers = data.get('answers', [])
+    if not isinstance(answers, list) or len(answers) > CHECKPOINT_MAX_ANSWERS:
+        return jsonify({'error': 'Invalid checkpoint'}), 400
+    deltas = [d for d in answer_deltas([a for a in answers if isinstance(a, dict)], attempt) if d[1] is not None]
+    if deltas:
+        conn = get_db()
+        save_progress(conn, attempt['id'], deltas)
+        conn.commit()
+    return jsonify({'saved': len(deltas)})
+
+@app.route('/api/attempt/progress')
+def attempt_progress():
+    """Latest checkpointed answer per question, so a reopened quiz can restore its answer sheet."""
+    attempt = current_attempt()
+    if not attempt: return jsonify({'error': 'No active attempt'}), 400
+    progress = load_progress(get_db(), attempt['id'])
+    response = jsonify({'answers': [{'question_id': question_id, 'answer': answer}
+                                    for question_id, answer in progress.items()]})
+    response.headers['Cache-Control'] = 'private, no-store'
+    return response
+
+# Assembled review payloads, keyed by question bank version and a digest of the answer sheet
+REVIEW_CACHE_SIZE = 256
+review_cache = OrderedDict()
+review_cache_lock = threading.Lock()
+
+def build_review(answers):
+    """Build the review payload for an answer sheet from the cached question bank."""
+    keys = [question_key(a.get('question_id')) for a in answers]
+    questions = question_bank.get_many(get_db(), keys)
+    review_data = []
+    for answer_data, key in zip(answers, keys):
+        q = questions.get(key)
+        if q:
+            review_data.append({
+                'id': answer_data.get('question_id'), 'question_text': q.question_text, 'option_a': q.option_a, 'option_b': q.option_b, 'option_c': q.option_c, 'option_d': q.option_d,
+                'user_answer': answer_data.get('answer'), 'correct_answer': q.correct_option, 'solution': q.solution if q.solution else "No detailed solution available."
+            })
+    return review_data
+
 def get_detailed_results(answers, course):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        review_data = []
-        for answer_data in answers:
-            question_id = answer_data.get('question_id')
-            user_answer = answer_data.get('answer')
-            cursor.execute('SELECT question_text, option_a, option_b, option_c, option_d, correct_option, solution FROM questions WHERE id = ?', (question_id,))
-            q = cursor.fetchone()
-            if q:
-                review_data.append({
-                    'id': question_id, 'question_text': q['question_text'], 'option_a': q['option_a'], 'option_b': q['option_b'], 'option_c': q['option_c'], 'option_d': q['option_d'],
-                    'user_answer': user_answer, 'correct_answer': q['correct_option'], 'solution': q['solution'] if q['solution'] else "No detailed solution available."
-                })
-        conn.close()
+        digest = hashlib.sha1(json.dumps(answers, sort_keys=True).encode()).hexdigest()
+        cache_key = (question_bank.version, digest)
+        with review_cache_lock:
+            if cache_key in review_cache:
+                review_cache.move_to_end(cache_key)
+                return review_cache[cache_key]
+        review_data = build_review(answers)
+        with review_cache_lock:
+            review_cache[cache_key] = review_data
+            if len(review_cache) > REVIEW_CACHE_SIZE:
+                review_cache.popitem(last=False)
         return review_data
     except Exception as e:
         return []
 
-def calculate_score(answers, course):
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        score = 0
-        for answer_data in answers:
-            question_id = answer_data.get('question_id')
-            user_answer = answer_data.get('answer')
-            if user_answer is None: continue
-            cursor.execute('SELECT correct_option FROM questions WHERE id = ?', (question_id,))
-            result = cursor.fetchone()
-            if result and user_answer == result['correct_option']:
-                score += 1
-        conn.close()
-        return score
-    except Exception as e:
-        return 0
+def question_key(question_id):
+    """Normalise a client-supplied question id the way SQLite compares it to questions.id."""
+    if isinstance(question_id, (bool, int)):
+        return int(question_id)
+    if isinstance(question_id, float):
+        return int(question_id) if question_id.is_integer() else None
+    if isinstance(question_id, str):
+        try:
+            return question_key(float(question_id)) if '.' in question_id else int(question_id)
+        except ValueError:
+            return None
+    return None
+
+def grade_answers(answers):
+    """Grade a whole answer sheet against the cached answer key.
+
+    Returns the score, the total and per-question correctness. Unanswered
+    questions (answer None) are skipped and unknown ids score zero.
+    """
+    keys = [question_key(a.get('question_id')) for a in answers]
+    answer_key = question_bank.get_many(get_db(), keys)
+    score = 0
+    results = []
+    for answer_data, key in zip(answers, keys):
+        user_answer = answer_data.get('answer')
+        row = answer_key.get(key)
+        correct = user_answer is not None and row is not None and user_answer == row.correct_option
+        if correct:
+            score += 1
+        results.append({'question_id': answer_data.get('question_id'), 'answer': user_answer, 'correct': correct})
+    return {'score': score, 'total': len(answers), 'results': results}
 
 @app.route('/result')
 def result():
-    return render_template('result.html', score=session.get('score', 0), total=session.get('total', 10), course=session.get('current_course', 'Unknown'))
+    attempt = current_attempt()
+    if not attempt or attempt['submitted_at'] is None:
+        return render_template('result.html', score=0, total=10, course=attempt['course_code'] if attempt else 'Unknown')
+    return render_template('result.html', score=attempt['score'], total=attempt['total'], course=attempt['course_code'])
 
 @app.route('/review')
 def review():
-    user_answers = session.get('user_answers', [])
-    course = session.get('current_course', 'Unknown')
+    attempt = current_attempt()
+    user_answers = attempt['answers'] if attempt else []
+    course = attempt['course_code'] if attempt else 'Unknown'
     review_data = get_detailed_results(user_answers, course)
     return render_template('review.html', review_data=review_data, course=course)
 
+# ==================== Scheduled sittings ====================
+
+def users_by_email(conn, emails):
+    """Return ({email: user_id}, unknown emails) for a list of addresses."""
+    emails = list(dict.fromkeys(e.strip().lower() for e in emails if e.strip()))
+    if not emails:
+        return {}, []
+    placeholders = ','.join('?' * len(emails))
+    found = {row['email'].lower(): row['id'] for row in conn.execute(
+        f'SELECT id, email FROM users WHERE lower(email) IN ({placeholders})', emails)}
+    return found, [e for e in emails if e not in found]
+
+def enroll_candidates(conn, sitting, emails):
+    found, unknown = users_by_email(conn, emails)
+    added = sittings.enroll(conn, sitting, found.values(), question_bank.course(conn, sitting['course_code']))
+    flash(f'Enrolled {added} new candidate(s).')
+    if unknown:
+        flash('No account for: ' + ', '.join(unknown))
+
+@app.route('/admin/sittings', methods=['GET', 'POST'])
+@admin_required
+def admin_sittings():
+    conn = get_db()
+    if request.method == 'POST':
+        try:
+            course = request.form['course'].strip()
+            num_questions = int(request.form['num_questions'])
+            duration_seconds = int(request.form['duration_minutes']) * 60
+            starts_at = sittings.parse_local(request.form['starts_at'])
+        except (KeyError, ValueError):
+            flash('Please fill in every field with a valid value.')
+            return redirect(url_for('admin_sittings'))
+        if num_questions <= 0 or duration_seconds <= 0:
+            flash('The number of questions and the duration must be greater than zero.')
+            return redirect(url_for('admin_sittings'))
+        if question_bank.count(conn, course) == 0:
+            flash(f'No questions found for course {course}')
+            return redirect(url_for('admin_sittings'))
+        sitting_id = sittings.create_sitting(conn, course, num_questions, duration_seconds, starts_at, session['user_id'])
+        enroll_candidates(conn, sittings.get_sitting(conn, sitting_id), request.form.get('emails', '').replace(',', ' ').split())
+        return redirect(url_for('admin_sittings'))
+    return render_template('admin_sittings.html', sittings=sittings.list_sittings(conn),
+                           local_time=sittings.local_time, state=sittings.state,
+                           courses=question_bank.course_codes(conn))
+
+@app.route('/admin/sittings/<int:sitting_id>/candidates', methods=['POST'])
+@admin_required
+def add_sitting_candidates(sitting_id):
+    conn = get_db()
+    sitting = sittings.get_sitting(conn, sitting_id)
+    if sitting is None:
+        return render_template('error.html', message='Sitting not found'), 404
+    enroll_candidates(conn, sitting, request.form.get('emails', '').replace(',', ' ').split())
+    return redirect(url_for('admin_sittings'))
+
+@app.route('/admin/questions')
+@admin_required
+def admin_question_stats():
+    conn = get_db()
+    # Catch the aggregates up on events logged since the last run, then read only the aggregates
+    analytics.aggregate(conn)
+    course = request.args.get('course') or None
+    return render_template('admin_questions.html', questions=analytics.hardest_questions(conn, course),
+                           course=course, courses=question_bank.course_codes(conn))
+
+@app.route('/sitting/<int:sitting_id>')
+@login_required
+def sitting(sitting_id):
+    conn = get_db()
+    details = sittings.get_sitting(conn, sitting_id)
+    attempt_id = details and sittings.candidate_attempt(conn, sitting_id, session['user_id'])
+    if not attempt_id:
+        return render_template('error.html', message='You are not enrolled in this sitting'), 404
+    status = sittings.state(details)
+    if status != 'open':
+        start, _ = sittings.window(details)
+        return render_template('sitting.html', sitting=details, status=status,
+                               starts_in=max(0, int((start - datetime.now(timezone.utc)).total_seconds())),
+                               starts_at=sittings.local_time(details['starts_at']))
+    
+    # The paper was drawn at enrollment; opening it is a keyed read, no sampling or writes
+    session['attempt_id'] = attempt_id
+    session['simulator_type'] = 'paid'
+    attempt = current_attempt()
+    if attempt['submitted_at'] is not None:
+        return redirect(url_for('result'))
+    _, end = sittings.window(details)
+    return render_template('quiz.html', course=details['course_code'], num_questions=attempt['num_questions'],
+                           duration_seconds=int((end - datetime.now(timezone.utc)).total_seconds()),
+                           deadline=attempt['deadline'])
+
+@app.route('/healthz')
+def healthz():
+    """Readiness check: a read-only look at the schema version, no writes."""
+    try:
+        version = get_db().execute('PRAGMA user_version').fetchone()[0]
+    except sqlite3.Error as e:
+        return jsonify({'status': 'unavailable', 'error': str(e)}), 503
+    if version < SCHEMA_VERSION:
+        return jsonify({'status': 'migrating', 'schema_version': version, 'expected': SCHEMA_VERSION}), 503
+    return jsonify({'status': 'ok', 'schema_version': version})
+
 @app.errorhandler(404)
+@cached_page
 def not_found(error): return render_template('error.html', message='Page not found'), 404
 
 @app.errorhandler(500)
+@cached_page
 def server_error(error): return render_template('error.html', message='Server error occurred'), 500
 
 if __name__ == '__main__':
+    init_db()
+    assets.build()
     app.run()
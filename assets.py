@@ -0,0 +1,213 @@
+"""Static asset build step and fingerprinted serving.
+
+`python assets.py` (also run by gunicorn's `on_starting` hook) copies every
+file under static/ into static/dist/ under a content-hashed name, writes
+precompressed .gz (and .br when the `brotli` package is installed) siblings
+for text assets, shrinks and palettizes PNG images with a .webp sibling, and
+records the mapping in static/dist/manifest.json.
+
+`init_app` makes `url_for('static', filename='style.css')` resolve to the
+hashed copy and serves dist/ files with immutable one-year caching, picking
+the best precompressed or WebP variant the client accepts. Without a
+manifest the plain files are served as before. `compress_response` applies
+the same negotiation to dynamic responses.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import sys
+import tempfile
+
+from flask import request, send_from_directory
+from PIL import Image
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+SKIP_DIRS = {DIST, 'uploads'}
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt', '.map'}
+# Largest logo edge in pixels; it is shown at most 250 CSS px wide, so this covers 2x screens
+IMAGE_MAX_EDGE = 512
+CACHE_MAX_AGE = 365 * 24 * 3600
+# Dynamic responses smaller than this are sent as-is
+COMPRESS_MIN_BYTES = 1024
+
+# Logical filename -> path of its hashed copy, relative to static/
+manifest = {}
+# Precompressed and WebP siblings present in dist/
+_variants = set()
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _encode(image, fmt, **options):
+    buf = tempfile.SpooledTemporaryFile()
+    image.save(buf, fmt, **options)
+    buf.seek(0)
+    return buf.read()
+
+
+def optimize_png(path):
+    """Return (png_bytes, webp_bytes) for a resized, palettized copy of a PNG."""
+    with Image.open(path) as image:
+        image.load()
+    image.thumbnail((IMAGE_MAX_EDGE, IMAGE_MAX_EDGE), Image.LANCZOS)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    method = Image.Quantize.FASTOCTREE if image.mode == 'RGBA' else Image.Quantize.MEDIANCUT
+    png = _encode(image.quantize(256, method=method), 'PNG', optimize=True)
+    webp = _encode(image, 'WEBP', quality=85, method=6)
+    return png, webp
+
+
+def build(static_dir=STATIC_DIR, out=sys.stdout):
+    """Write fingerprinted, compressed copies of static/ into static/dist/."""
+    dist_dir = os.path.join(static_dir, DIST)
+    built = {}
+    before = after = 0
+    for root, dirs, files in os.walk(static_dir):
+        if root == static_dir:
+            dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+        for name in sorted(files):
+            source = os.path.join(root, name)
+            logical = os.path.relpath(source, static_dir).replace(os.sep, '/')
+            stem, ext = os.path.splitext(logical)
+            ext = ext.lower()
+            with open(source, 'rb') as f:
+                data = f.read()
+            before += len(data)
+
+            webp = None
+            if ext == '.png':
+                data, webp = optimize_png(source)
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            hashed = f'{DIST}/{stem}.{digest}{ext}'
+            target = os.path.join(static_dir, hashed)
+            _write_atomic(target, data)
+            smallest = len(data)
+
+            if webp is not None and len(webp) < len(data):
+                _write_atomic(target + '.webp', webp)
+                smallest = len(webp)
+            if ext in COMPRESSIBLE:
+                gz = gzip.compress(data, compresslevel=9, mtime=0)
+                _write_atomic(target + '.gz', gz)
+                smallest = len(gz)
+                if brotli is not None:
+                    br = brotli.compress(data, quality=11)
+                    _write_atomic(target + '.br', br)
+                    smallest = min(smallest, len(br))
+            after += smallest
+            built[logical] = hashed
+            print(f'{logical} -> {hashed} ({len(data)} bytes, best variant {smallest})', file=out)
+
+    _write_atomic(os.path.join(dist_dir, MANIFEST), json.dumps(built, indent=2, sort_keys=True).encode())
+    _prune(static_dir, built)
+    print(f'Built {len(built)} assets: {before} bytes -> {after} bytes on the wire', file=out)
+    _load(static_dir)
+    return built
+
+
+def _prune(static_dir, built):
+    """Delete copies left behind by earlier builds."""
+    keep = {MANIFEST}
+    for hashed in built.values():
+        rel = hashed[len(DIST) + 1:]
+        keep.update(rel + suffix for suffix in ('', '.br', '.gz', '.webp'))
+    dist_dir = os.path.join(static_dir, DIST)
+    for root, dirs, files in os.walk(dist_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            if os.path.relpath(path, dist_dir).replace(os.sep, '/') not in keep:
+                os.unlink(path)
+
+
+def _load(static_dir):
+    path = os.path.join(static_dir, DIST, MANIFEST)
+    manifest.clear()
+    _variants.clear()
+    if not os.path.exists(path):
+        return
+    with open(path) as f:
+        manifest.update(json.load(f))
+    for hashed in manifest.values():
+        for suffix in ('.br', '.gz', '.webp'):
+            if os.path.exists(os.path.join(static_dir, hashed + suffix)):
+                _variants.add(hashed + suffix)
+
+
+def compress_response(response):
+    """Compress a dynamic 200 response with brotli or gzip, whichever the client accepts."""
+    if response.status_code != 200 or response.direct_passthrough or response.content_encoding:
+        return response
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+    response.vary.add('Accept-Encoding')
+    if brotli is not None and request.accept_encodings['br']:
+        response.set_data(brotli.compress(data, quality=5))
+        response.content_encoding = 'br'
+    elif request.accept_encodings['gzip']:
+        response.set_data(gzip.compress(data, compresslevel=6))
+        response.content_encoding = 'gzip'
+    return response
+
+
+def _accepts_webp():
+    # Match image/webp explicitly; */* is also sent by browsers that cannot decode it
+    return any(value == 'image/webp' and quality for value, quality in request.accept_mimetypes)
+
+
+def init_app(app):
+    """Route url_for('static') through the manifest and serve dist/ with immutable caching."""
+    static_dir = app.static_folder
+    _load(static_dir)
+    serve_static = app.view_functions['static']
+
+    @app.url_defaults
+    def fingerprint_static(endpoint, values):
+        if endpoint == 'static' and manifest:
+            values['filename'] = manifest.get(values.get('filename'), values.get('filename'))
+
+    def static(filename):
+        if not filename.startswith(DIST + '/') or filename.endswith('/' + MANIFEST):
+            return serve_static(filename=filename)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        served, encoding = filename, None
+        if filename + '.br' in _variants and request.accept_encodings['br']:
+            served, encoding = filename + '.br', 'br'
+        elif filename + '.gz' in _variants and request.accept_encodings['gzip']:
+            served, encoding = filename + '.gz', 'gzip'
+        elif filename + '.webp' in _variants and _accepts_webp():
+            served, mimetype = filename + '.webp', 'image/webp'
+        response = send_from_directory(static_dir, served, mimetype=mimetype, max_age=CACHE_MAX_AGE)
+        if encoding:
+            response.content_encoding = encoding
+        response.vary.add('Accept' if filename + '.webp' in _variants else 'Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    app.view_functions['static'] = static
+
+
+if __name__ == '__main__':
+    build()
@@ -0,0 +1,155 @@
+import json
+import secrets
+import time
+
+# Allowance for network latency on an auto-submit fired at the deadline
+SUBMIT_GRACE_SECONDS = 30
+# How long an attempt abandoned past its deadline, and the checkpoints of a submitted one, are kept
+RETENTION_SECONDS = 7 * 24 * 3600
+
+
+def deadline_after(duration_seconds, now=None):
+    """Unix time at which an attempt of this length started now ends, or None if untimed."""
+    if duration_seconds <= 0:
+        return None
+    return int(now or time.time()) + duration_seconds
+
+
+def is_late(attempt, now=None):
+    """True once the attempt's deadline plus the grace period has passed."""
+    deadline = attempt['deadline']
+    return deadline is not None and (now or time.time()) > deadline + SUBMIT_GRACE_SECONDS
+
+
+def create_attempt(conn, user_id, course, simulator, num_questions, duration_seconds, deadline=None,
+                   selection='random'):
+    """Start a new quiz attempt and return its id."""
+    attempt_id = secrets.token_urlsafe(16)
+    conn.execute('''
+        INSERT INTO attempts (id, user_id, course_code, simulator, num_questions, duration_seconds, deadline,
+                              selection)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (attempt_id, user_id, course, simulator, num_questions, duration_seconds, deadline, selection))
+    conn.commit()
+    return attempt_id
+
+
+def attempt_config(attempt):
+    """The (num_questions, duration_seconds, selection) an attempt was started with."""
+    return attempt['num_questions'], attempt['duration_seconds'], attempt['selection']
+
+
+def abandon_attempt(conn, attempt_id):
+    """Mark an unsubmitted attempt as given up; it can no longer be resumed or submitted."""
+    conn.execute('UPDATE attempts SET abandoned_at = CURRENT_TIMESTAMP WHERE id = ? AND submitted_at IS NULL',
+                 (attempt_id,))
+    conn.commit()
+
+
+def in_sitting(conn, attempt_id):
+    """True if the attempt is a sitting paper, which only opens through its sitting."""
+    return conn.execute('SELECT 1 FROM sitting_candidates WHERE attempt_id = ?', (attempt_id,)).fetchone() is not None
+
+
+def open_attempt(conn, user_id, course, simulator, config, now=None):
+    """Return the id of the user's latest timed, unsubmitted attempt still before its deadline, or None.
+
+    Lets /quiz continue an attempt from another browser or after the session
+    cookie is lost, so its deadline cannot be reset by reopening the same
+    test. Only an attempt started with the same `config` (see attempt_config)
+    is returned. Sitting papers are left out; they only open through their
+    sitting.
+    """
+    num_questions, duration_seconds, selection = config
+    row = conn.execute('''
+        SELECT a.id FROM attempts a
+        WHERE a.user_id = ? AND a.course_code = ? AND a.simulator = ? AND a.submitted_at IS NULL
+          AND a.abandoned_at IS NULL AND a.deadline > ?
+          AND a.num_questions = ? AND a.duration_seconds = ? AND a.selection = ?
+          AND NOT EXISTS (SELECT 1 FROM sitting_candidates c WHERE c.attempt_id = a.id)
+        ORDER BY a.created_at DESC LIMIT 1
+    ''', (user_id, course, simulator, int(now or time.time()), num_questions, duration_seconds, selection)).fetchone()
+    return row[0] if row else None
+
+
+def load_attempt(conn, attempt_id):
+    """Return the attempt as a dict with its answers decoded, or None."""
+    if not attempt_id:
+        return None
+    row = conn.execute('SELECT * FROM attempts WHERE id = ?', (attempt_id,)).fetchone()
+    if row is None:
+        return None
+    attempt = dict(row)
+    attempt['answers'] = json.loads(attempt['answers']) if attempt['answers'] else []
+    attempt['question_ids'] = json.loads(attempt['question_ids']) if attempt['question_ids'] else []
+    return attempt
+
+
+def record_paper(conn, attempt_id, seed, question_ids):
+    """Remember the seed and the ordered question ids drawn for an attempt."""
+    conn.execute('UPDATE attempts SET seed = ?, question_ids = ? WHERE id = ?',
+                 (seed, json.dumps(question_ids, separators=(',', ':')), attempt_id))
+    conn.commit()
+
+
+def save_progress(conn, attempt_id, deltas):
+    """Append a batch of (question_id, answer) checkpoints (the caller commits)."""
+    conn.executemany('INSERT INTO attempt_progress (attempt_id, question_id, answer) VALUES (?, ?, ?)',
+                     [(attempt_id, question_id, answer) for question_id, answer in deltas])
+
+
+def load_progress(conn, attempt_id):
+    """Return {question_id: answer} with the latest checkpoint for each question."""
+    rows = conn.execute('SELECT question_id, answer FROM attempt_progress WHERE attempt_id = ? ORDER BY id',
+                        (attempt_id,))
+    return {question_id: answer for question_id, answer in rows}
+
+
+def assemble_answers(attempt, progress, deltas=()):
+    """Build the full answer sheet in paper order from checkpoints plus any final deltas.
+
+    Deltas with an answer override the stored checkpoint; a None delta never
+    erases one.
+    """
+    latest = dict(progress)
+    for question_id, answer in deltas:
+        if answer is not None:
+            latest[question_id] = answer
+    return [{'question_id': question_id, 'answer': latest.get(question_id)} for question_id in attempt['question_ids']]
+
+
+def finish_attempt(conn, attempt_id, answers, score):
+    """Record the submitted answer sheet and score (the caller commits)."""
+    conn.execute('''
+        UPDATE attempts SET answers = ?, score = ?, total = ?, submitted_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+    ''', (json.dumps(answers, separators=(',', ':')), score, len(answers), attempt_id))
+
+
+def purge_stale(conn, retention_seconds=RETENTION_SECONDS, now=None):
+    """Delete abandoned attempts and checkpoints no longer needed; return (attempts, checkpoints) deleted.
+
+    An attempt is abandoned when it was never submitted and its deadline
+    (its start, if untimed), or the moment it was started over, is more than
+    `retention_seconds` ago. Sitting
+    papers stay with their sitting. Checkpoints of submitted attempts are
+    dropped after the same window, since the answer sheet is stored on the
+    attempt itself.
+    """
+    cutoff = int(now or time.time()) - retention_seconds
+    abandoned = [row[0] for row in conn.execute('''
+        SELECT a.id FROM attempts a
+        WHERE a.submitted_at IS NULL
+          AND (a.deadline < :cutoff OR (a.deadline IS NULL AND a.created_at < datetime(:cutoff, 'unixepoch'))
+               OR a.abandoned_at < datetime(:cutoff, 'unixepoch'))
+          AND NOT EXISTS (SELECT 1 FROM sitting_candidates c WHERE c.attempt_id = a.id)
+    ''', {'cutoff': cutoff})]
+    checkpoints = conn.execute('''
+        DELETE FROM attempt_progress WHERE attempt_id IN (
+            SELECT id FROM attempts WHERE submitted_at < datetime(?, 'unixepoch'))
+    ''', (cutoff,)).rowcount
+    for attempt_id in abandoned:
+        checkpoints += conn.execute('DELETE FROM attempt_progress WHERE attempt_id = ?', (attempt_id,)).rowcount
+        conn.execute('DELETE FROM attempts WHERE id = ?', (attempt_id,))
+    conn.commit()
+    return len(abandoned), checkpoints
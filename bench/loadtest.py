@@ -0,0 +1,265 @@
+"""Reproducible load test for the quiz flow.
+
+Seeds a scratch database with a synthetic question bank, starts the app under
+gunicorn on a local port with Paystack replaced by a stub, and drives
+concurrent candidate sessions through
+/configure-test -> /quiz -> /api/questions -> /submit -> /review.
+Per-endpoint p50/p95/p99 latency and throughput are printed and written to
+bench/results/latest.json.
+
+Usage:
+    python bench/loadtest.py                     # run and compare with bench/baseline.json
+    python bench/loadtest.py --save-baseline     # run and store the result as the new baseline
+    python bench/loadtest.py --candidates 200 --concurrency 50 --questions 50000
+
+Exits with status 1 when any endpoint's p95 regresses by more than
+--tolerance against the baseline.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+
+from import_questions import import_files  # noqa: E402
+from migrations import migrate  # noqa: E402
+from stubs import start_paystack_stub  # noqa: E402
+
+BASELINE_PATH = os.path.join(BENCH_DIR, 'baseline.json')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+COURSE = 'BENCH101'
+ENDPOINTS = ['configure-test', 'quiz', 'api/questions', 'submit', 'review']
+
+
+def seed_database(path, num_questions, seed):
+    """Create a scratch database holding a synthetic question bank."""
+    rng = random.Random(seed)
+    bank = os.path.join(os.path.dirname(path), 'bank.jsonl')
+    with open(bank, 'w') as f:
+        for i in range(num_questions):
+            course = COURSE if i % 4 == 0 else f'SYN{i % 25:03d}'
+            f.write(json.dumps({
+                'course_code': course,
+                'question_text': f'Synthetic question {i}: what is {rng.randint(1, 999)} + {rng.randint(1, 999)}?',
+                'option_a': str(rng.randint(1, 2000)), 'option_b': str(rng.randint(1, 2000)),
+                'option_c': str(rng.randint(1, 2000)), 'option_d': str(rng.randint(1, 2000)),
+                'correct_option': rng.choice('ABCD'),
+                'solution': 'Add the two numbers. ' * rng.randint(1, 8),
+            }) + '\n')
+
+    os.environ['QUIZ_DB_PATH'] = path
+    from init_db import init_db
+    init_db(path)
+    conn = sqlite3.connect(path)
+    migrate(conn)
+    import_files(conn, [bank], out=open(os.devnull, 'w'))
+    conn.close()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(db_path, paystack_url, port, workers, worker_class):
+    env = dict(os.environ,
+               QUIZ_DB_PATH=db_path,
+               PAYSTACK_BASE_URL=paystack_url,
+               PAYSTACK_SECRET_KEY='sk_test_bench',
+               GOOGLE_CLIENT_ID='', GOOGLE_CLIENT_SECRET='',
+               SECRET_KEY='bench-secret',
+               WEB_CONCURRENCY=str(workers),
+               GUNICORN_WORKER_CLASS=worker_class)
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-b', f'127.0.0.1:{port}', '--log-level', 'warning', 'app:app'],
+        cwd=ROOT, env=env)
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            if requests.get(f'{base_url}/healthz', timeout=1).ok:
+                return process, base_url
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('gunicorn did not become ready within 30s')
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def timed(self, endpoint, call):
+        started = time.perf_counter()
+        try:
+            response = call()
+            ok = response.status_code < 400
+        except requests.RequestException:
+            response, ok = None, False
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.samples[endpoint].append(elapsed)
+            if not ok:
+                self.errors[endpoint] += 1
+        return response
+
+
+def prepare_candidate(base_url, index):
+    """Register, log in and pay for one candidate; return their HTTP session."""
+    http = requests.Session()
+    email = f'candidate{index}@bench.local'
+    http.post(f'{base_url}/register', data={'username': f'candidate{index}', 'email': email, 'password': 'bench'})
+    http.post(f'{base_url}/login', data={'email': email, 'password': 'bench'})
+    http.get(f'{base_url}/verify-payment/bench-{index}')
+    return http
+
+
+def run_session(base_url, http, recorder, num_questions, rng):
+    """Drive one candidate through a paid exam."""
+    recorder.timed('configure-test', lambda: http.get(
+        f'{base_url}/configure-test', params={'course': COURSE, 'simulator': 'paid'}))
+    recorder.timed('quiz', lambda: http.get(f'{base_url}/quiz', params={
+        'course': COURSE, 'num_questions': num_questions, 'hours': 0, 'minutes': 30, 'simulator': 'paid'}))
+    response = recorder.timed('api/questions', lambda: http.get(
+        f'{base_url}/api/questions', params={'course': COURSE, 'limit': num_questions, 'format': 'columns'}))
+    question_ids = response.json()['id'] if response is not None and response.ok else []
+    answers = [{'question_id': question_id, 'answer': rng.choice('ABCD')} for question_id in question_ids]
+    recorder.timed('submit', lambda: http.post(f'{base_url}/submit', json={'answers': answers}))
+    recorder.timed('review', lambda: http.get(f'{base_url}/review'))
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarise(recorder, wall_time):
+    summary = {}
+    for endpoint in ENDPOINTS:
+        values = sorted(recorder.samples[endpoint])
+        summary[endpoint] = {
+            'requests': len(values),
+            'errors': recorder.errors[endpoint],
+            'p50_ms': round(percentile(values, 50) * 1000, 2),
+            'p95_ms': round(percentile(values, 95) * 1000, 2),
+            'p99_ms': round(percentile(values, 99) * 1000, 2),
+            'throughput_rps': round(len(values) / wall_time, 1) if wall_time else 0,
+        }
+    return summary
+
+
+def print_report(summary, baseline=None):
+    print(f'{"endpoint":<16}{"reqs":>7}{"errs":>6}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"req/s":>9}'
+          + ('   p95 vs baseline' if baseline else ''))
+    for endpoint, stats in summary.items():
+        line = (f'{endpoint:<16}{stats["requests"]:>7}{stats["errors"]:>6}{stats["p50_ms"]:>10}'
+                f'{stats["p95_ms"]:>10}{stats["p99_ms"]:>10}{stats["throughput_rps"]:>9}')
+        if baseline and endpoint in baseline:
+            before = baseline[endpoint]['p95_ms']
+            change = (stats['p95_ms'] - before) / before * 100 if before else 0
+            line += f'   {change:+.1f}%'
+        print(line)
+
+
+def find_regressions(summary, baseline, tolerance):
+    regressions = []
+    for endpoint, stats in summary.items():
+        before = baseline.get(endpoint, {}).get('p95_ms')
+        if before and stats['p95_ms'] > before * (1 + tolerance):
+            regressions.append(f'{endpoint}: p95 {before}ms -> {stats["p95_ms"]}ms')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the quiz flow against a local gunicorn.')
+    parser.add_argument('--questions', type=int, default=20000, help='synthetic question bank size')
+    parser.add_argument('--candidates', type=int, default=100, help='number of candidate sessions')
+    parser.add_argument('--concurrency', type=int, default=20, help='concurrent candidates')
+    parser.add_argument('--paper-size', type=int, default=50, help='questions per exam')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+    parser.add_argument('--worker-class', default='gthread', help='gunicorn worker class')
+    parser.add_argument('--seed', type=int, default=1234, help='seed for the bank and answers')
+    parser.add_argument('--save-baseline', action='store_true', help='store this run as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed p95 slowdown vs baseline')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='cbt-bench-')
+    db_path = os.path.join(workdir, 'quiz.db')
+    stub, paystack_url = start_paystack_stub()
+    process = None
+    sessions = []
+    try:
+        print(f'Seeding {args.questions} questions into {db_path} ...')
+        seed_database(db_path, args.questions, args.seed)
+        process, base_url = start_server(db_path, paystack_url, free_port(), args.workers, args.worker_class)
+
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            sessions = list(pool.map(lambda i: prepare_candidate(base_url, i), range(args.candidates)))
+
+        recorder = Recorder()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            futures = [pool.submit(run_session, base_url, http, recorder, args.paper_size,
+                                   random.Random(args.seed + i))
+                       for i, http in enumerate(sessions)]
+            for future in futures:
+                future.result()
+        wall_time = time.perf_counter() - started
+    finally:
+        for http in sessions:
+            http.close()
+        if process:
+            process.terminate()
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        stub.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    summary = summarise(recorder, wall_time)
+    result = {'config': vars(args), 'wall_time_s': round(wall_time, 2), 'endpoints': summary}
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(os.path.join(RESULTS_DIR, 'latest.json'), 'w') as f:
+        json.dump(result, f, indent=2)
+
+    baseline = None
+    if os.path.exists(BASELINE_PATH) and not args.save_baseline:
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)['endpoints']
+    print_report(summary, baseline)
+
+    if args.save_baseline:
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f'Baseline saved to {BASELINE_PATH}')
+    elif baseline:
+        regressions = find_regressions(summary, baseline, args.tolerance)
+        if regressions:
+            print('Regressions against baseline:\n  ' + '\n  '.join(regressions))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
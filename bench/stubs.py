@@ -0,0 +1,45 @@
+"""Local stand-ins for third-party services used by the load test.
+
+Only Paystack needs a stub: candidates sign in with email/password, and the
+load test blanks GOOGLE_CLIENT_ID so the app never contacts Google.
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class PaystackStubHandler(BaseHTTPRequestHandler):
+    """Answers GET /transaction/verify/<reference> like Paystack does.
+
+    References starting with "fail" are reported as unsuccessful payments;
+    everything else is a successful ₦500 charge.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if not self.path.startswith('/transaction/verify/'):
+            self._send(404, {'status': False, 'message': 'Not found'})
+            return
+        reference = self.path.rsplit('/', 1)[-1]
+        status = 'failed' if reference.startswith('fail') else 'success'
+        self._send(200, {'status': True, 'message': 'Verification successful',
+                         'data': {'reference': reference, 'status': status, 'amount': 50000}})
+
+    def _send(self, code, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_paystack_stub(host='127.0.0.1', port=0):
+    """Start the stub in a background thread and return (server, base_url)."""
+    server = ThreadingHTTPServer((host, port), PaystackStubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://{host}:{server.server_port}'
@@ -0,0 +1,5 @@
+"""Settings shared by the app, its workers and the command-line tools."""
+import os
+
+# QUIZ_DB_PATH lets benchmarks and tooling point at a scratch database
+DB_PATH = os.getenv('QUIZ_DB_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database', 'quiz.db'))
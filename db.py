@@ -0,0 +1,170 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from flask import g
+
+from config import DB_PATH
+
+# Maximum number of idle connections each worker keeps around
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 8))
+
+# With DB_LOCK_WAIT_MS set, lock waits happen in Python instead of in SQLite's
+# busy handler, which sleeps inside C where a gevent hub cannot switch away.
+# time.sleep is monkey-patched under gevent, so a waiting request yields.
+LOCK_WAIT_SECONDS = int(os.getenv('DB_LOCK_WAIT_MS', 0)) / 1000
+MAX_LOCK_RETRY_DELAY = 0.02
+
+# Pragmas applied once when a connection is opened
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA mmap_size = 268435456',
+    'PRAGMA cache_size = -16000',
+    f"PRAGMA busy_timeout = {0 if LOCK_WAIT_SECONDS else int(os.getenv('DB_BUSY_TIMEOUT_MS', 5000))}",
+)
+
+
+def retry_locked(call, *args):
+    """Run call(*args), sleeping and retrying while another connection holds the write lock."""
+    if not LOCK_WAIT_SECONDS:
+        return call(*args)
+    deadline = time.monotonic() + LOCK_WAIT_SECONDS
+    delay = 0.001
+    while True:
+        try:
+            return call(*args)
+        except sqlite3.OperationalError as error:
+            if 'database is locked' not in str(error) or time.monotonic() >= deadline:
+                raise
+        time.sleep(delay)
+        delay = min(delay * 2, MAX_LOCK_RETRY_DELAY)
+
+
+class Cursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        return retry_locked(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        # A WAL writer takes the lock on its first write, so a retry never repeats applied rows
+        return retry_locked(super().executemany, sql, seq_of_parameters)
+
+
+class Connection(sqlite3.Connection):
+    """Connection whose statements and commits wait for locks through retry_locked."""
+
+    def cursor(self, factory=Cursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        return retry_locked(super().commit)
+
+
+# Connection class used for new connections; metrics swaps in a timed subclass
+connection_factory = Connection
+
+
+def connect(path=DB_PATH):
+    """Open a new connection with the standard pragmas applied."""
+    conn = sqlite3.connect(path, check_same_thread=False, factory=connection_factory)
+    conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class ConnectionPool:
+    """A bounded pool of SQLite connections for a single worker process.
+
+    Connections are handed out per request and returned on teardown, so each
+    request reuses an open connection (and its page cache) instead of paying
+    for connect/close. The pool is reset after a fork so workers never share
+    a connection inherited from the master process.
+    """
+
+    def __init__(self, path=DB_PATH, size=POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._idle = queue.LifoQueue(maxsize=self.size)
+                    self._pid = os.getpid()
+
+    def acquire(self):
+        self._check_pid()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return connect(self.path)
+
+    def release(self, conn):
+        self._check_pid()
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            return
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+pool = ConnectionPool()
+
+
+def get_db():
+    """Return the connection bound to the current app context."""
+    if 'db' not in g:
+        g.db = pool.acquire()
+    return g.db
+
+
+def close_db(exception=None):
+    conn = g.pop('db', None)
+    if conn is not None:
+        pool.release(conn)
+
+
+def init_app(app):
+    app.teardown_appcontext(close_db)
+
+
+def fetch_by_ids(conn, table, columns, ids, chunk_size=500):
+    """Fetch rows from `table` for many primary keys using set-based lookups.
+
+    Returns a dict mapping id -> row. Ids are looked up in chunks so a long
+    list never exceeds SQLite's bound-parameter limit.
+    """
+    ids = list(dict.fromkeys(i for i in ids if i is not None))
+    rows = {}
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        placeholders = ', '.join('?' * len(chunk))
+        cursor = conn.execute(
+            f'SELECT id, {", ".join(columns)} FROM {table} WHERE id IN ({placeholders})', chunk)
+        for row in cursor:
+            rows[row['id']] = row
+    return rows
@@ -0,0 +1,53 @@
+# Gunicorn configuration, picked up automatically by `gunicorn app:app`.
+#
+# Two serving modes, selected with GUNICORN_WORKER_CLASS:
+#
+#   gthread (default)  2 x cores + 1 processes, each with GUNICORN_THREADS
+#                      threads. A blocking Paystack or Google call only holds
+#                      one thread, not a whole worker.
+#   gevent             One process per core, each multiplexing up to
+#                      GUNICORN_WORKER_CONNECTIONS requests on greenlets.
+#                      gunicorn monkey-patches the standard library before
+#                      the app is imported, so requests (Paystack, OAuth),
+#                      the connection pool's locks and queues, and SQLite
+#                      lock waits all yield cooperatively. Use this mode for
+#                      exam-day traffic.
+#
+# WEB_CONCURRENCY overrides the computed number of worker processes.
+
+import multiprocessing
+import os
+
+from assets import build as build_assets
+from init_db import init_db
+
+cores = multiprocessing.cpu_count()
+
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+
+if worker_class == 'gevent':
+    workers = int(os.getenv('WEB_CONCURRENCY', cores))
+    worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))
+    # Many greenlets share each worker's SQLite pool. SQLite's busy handler
+    # sleeps inside C and would block the whole hub, so lock waits are retried
+    # in Python with the patched time.sleep instead (see db.retry_locked).
+    os.environ.setdefault('DB_POOL_SIZE', '64')
+    os.environ.setdefault('DB_LOCK_WAIT_MS', '5000')
+else:
+    workers = int(os.getenv('WEB_CONCURRENCY', cores * 2 + 1))
+    threads = int(os.getenv('GUNICORN_THREADS', 4))
+
+# Bound slow clients and upstreams; the Paystack client has its own shorter timeouts
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+
+# Keep the worker heartbeat file off slow container disks
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+def on_starting(server):
+    # Create/migrate the database and build static assets once in the master,
+    # before any worker forks and loads the asset manifest
+    init_db()
+    build_assets()
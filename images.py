@@ -0,0 +1,126 @@
+"""Profile picture upload pipeline.
+
+Uploads are streamed to a temporary file with a hard size cap, decoded with
+Pillow and re-encoded into bounded-size variants (a thumbnail and a display
+size) in both WebP and JPEG. Re-encoding drops EXIF, GPS and other metadata.
+Variants are named after the SHA-256 of the uploaded bytes, so a name never
+changes meaning and clients may cache it forever.
+"""
+import hashlib
+import os
+import tempfile
+
+from flask import send_from_directory, url_for
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+MAX_UPLOAD_BYTES = int(os.getenv('MAX_UPLOAD_BYTES', 5 * 1024 * 1024))
+CHUNK_SIZE = 64 * 1024
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP'}
+# Largest edge in pixels for each variant
+VARIANTS = {'thumb': 128, 'display': 512}
+FORMATS = {'webp': ('WEBP', {'quality': 80, 'method': 4}),
+           'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True})}
+CACHE_MAX_AGE = 365 * 24 * 3600
+
+# Refuse to decode anything larger than 40 megapixels (decompression bombs).
+# Pillow only raises at twice its limit, so process_upload checks the header
+# size itself; the Pillow limit is a backstop for other callers.
+MAX_IMAGE_PIXELS = 40_000_000
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+
+class ImageError(ValueError):
+    """The upload is too large or is not a supported image."""
+
+
+def _spool(stream, directory):
+    """Copy the upload to a temp file in chunks; return (path, sha256 hex)."""
+    digest = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(dir=directory, suffix='.upload')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise ImageError(f'Image is larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB.')
+                digest.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path, digest.hexdigest()
+
+
+def _write_atomic(image, path, fmt, options):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            image.save(f, fmt, **options)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def variant_name(key, variant, ext):
+    return f'{key}-{variant}.{ext}'
+
+
+def process_upload(stream, directory):
+    """Store the variants for an uploaded image and return its content key."""
+    path, digest = _spool(stream, directory)
+    key = digest[:32]
+    try:
+        if all(os.path.exists(os.path.join(directory, variant_name(key, v, e)))
+               for v in VARIANTS for e in FORMATS):
+            return key
+        try:
+            with Image.open(path) as source:
+                if source.format not in ALLOWED_FORMATS:
+                    raise ImageError('Unsupported image type. Please upload a JPEG, PNG, GIF or WebP image.')
+                # The size comes from the header, so this runs before any pixel is decoded
+                if source.width * source.height > MAX_IMAGE_PIXELS:
+                    raise ImageError(f'Image is larger than {MAX_IMAGE_PIXELS // 1_000_000} megapixels.')
+                source.seek(0)
+                image = ImageOps.exif_transpose(source)
+                image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+        except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError) as e:
+            raise ImageError('The file is not a readable image.') from e
+
+        flat = image
+        if image.mode == 'RGBA':
+            # JPEG has no alpha channel, so composite onto white
+            flat = Image.new('RGB', image.size, (255, 255, 255))
+            flat.paste(image, mask=image.getchannel('A'))
+
+        for variant, edge in VARIANTS.items():
+            for ext, (fmt, options) in FORMATS.items():
+                resized = (image if fmt == 'WEBP' else flat).copy()
+                resized.thumbnail((edge, edge), Image.LANCZOS)
+                _write_atomic(resized, os.path.join(directory, variant_name(key, variant, ext)), fmt, options)
+        return key
+    finally:
+        os.unlink(path)
+
+
+def init_app(app, directory):
+    """Serve stored variants with far-future caching and expose `profile_image_url`."""
+
+    @app.route('/media/<path:filename>')
+    def media(filename):
+        response = send_from_directory(directory, filename, max_age=CACHE_MAX_AGE)
+        response.cache_control.immutable = True
+        response.cache_control.public = True
+        return response
+
+    @app.template_global()
+    def profile_image_url(picture, variant='display', ext='webp'):
+        # Pictures uploaded before the pipeline are stored by their original filename
+        if '.' in picture:
+            return url_for('static', filename='uploads/' + picture)
+        return url_for('media', filename=variant_name(picture, variant, ext))
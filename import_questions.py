@@ -0,0 +1,168 @@
+"""Bulk question bank importer.
+
+Streams CSV or JSON Lines files into the `questions` table in large
+transactions. Rows are validated against the table's schema and deduplicated
+by content hash, so re-importing the same file is a no-op.
+
+Usage:
+    python import_questions.py questions.csv more.jsonl [--chunk-size 10000]
+
+CSV files need a header row with the column names below; JSON Lines files
+hold one object per line with the same keys.
+"""
+import argparse
+import csv
+import hashlib
+import json
+import sqlite3
+import sys
+import time
+
+from config import DB_PATH
+from migrations import SEARCH_COLUMNS, SEARCH_TRIGGERS, migrate
+
+REQUIRED_FIELDS = ('course_code', 'question_text', 'option_a', 'option_b', 'option_c', 'option_d', 'correct_option')
+FIELDS = REQUIRED_FIELDS + ('solution',)
+VALID_OPTIONS = {'A', 'B', 'C', 'D'}
+
+INSERT_SQL = f'''INSERT OR IGNORE INTO questions ({', '.join(FIELDS)}, content_hash)
+                 VALUES ({', '.join('?' * (len(FIELDS) + 1))})'''
+
+# Secondary indexes dropped during a bulk load and rebuilt once at the end
+DEFERRED_INDEXES = {
+    'idx_questions_course': 'CREATE INDEX IF NOT EXISTS idx_questions_course ON questions (course_code, id)',
+}
+
+
+class InvalidRow(ValueError):
+    pass
+
+
+def question_hash(course_code, question_text, option_a, option_b, option_c, option_d):
+    """Content hash identifying a question regardless of its answer or solution."""
+    parts = (course_code, question_text, option_a, option_b, option_c, option_d)
+    normalised = '\x1f'.join(' '.join(str(p).split()).lower() for p in parts)
+    return hashlib.sha1(normalised.encode('utf-8')).hexdigest()
+
+
+def _text(value):
+    """Strip text and turn JSON numbers into text (options like 10 or 9.8 are common); other values pass through."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    return value.strip() if isinstance(value, str) else value
+
+
+def validate(record):
+    """Return the row tuple for INSERT_SQL, or raise InvalidRow."""
+    values = []
+    for field in REQUIRED_FIELDS:
+        value = _text(record.get(field))
+        if value is None or value == '':
+            raise InvalidRow(f'missing {field}')
+        if not isinstance(value, str):
+            raise InvalidRow(f'{field} must be text')
+        values.append(value)
+    values[-1] = values[-1].upper()
+    if values[-1] not in VALID_OPTIONS:
+        raise InvalidRow(f'correct_option must be one of A, B, C, D (got {values[-1]!r})')
+    solution = _text(record.get('solution'))
+    solution = solution if isinstance(solution, str) else None
+    values.append(solution or None)
+    values.append(question_hash(*values[:6]))
+    return tuple(values)
+
+
+def read_records(path, fmt=None):
+    """Yield (record, error) pairs from a CSV or JSON Lines file without loading it whole."""
+    fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            for record in csv.DictReader(f):
+                yield record, None
+        else:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    yield None, f'line {line_number}: invalid JSON ({e})'
+                    continue
+                yield record, None
+
+
+def import_files(conn, paths, fmt=None, chunk_size=10000, out=sys.stdout):
+    """Import every file in one pass and return (inserted, duplicates, invalid)."""
+    inserted = duplicates = invalid = 0
+    started = time.perf_counter()
+
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('PRAGMA cache_size = -65536')
+    conn.commit()
+    for name in DEFERRED_INDEXES:
+        conn.execute(f'DROP INDEX IF EXISTS {name}')
+    # The search index is filled once for the new rows instead of row by row from triggers
+    for name in SEARCH_TRIGGERS:
+        conn.execute(f'DROP TRIGGER IF EXISTS {name}')
+    last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM questions').fetchone()[0]
+
+    def flush(batch):
+        nonlocal inserted, duplicates
+        cursor = conn.executemany(INSERT_SQL, batch)
+        conn.commit()
+        inserted += cursor.rowcount
+        duplicates += len(batch) - cursor.rowcount
+
+    try:
+        for path in paths:
+            batch = []
+            for number, (record, error) in enumerate(read_records(path, fmt), 1):
+                if error is None:
+                    try:
+                        batch.append(validate(record if isinstance(record, dict) else {}))
+                    except InvalidRow as e:
+                        error = f'row {number}: {e}'
+                if error:
+                    invalid += 1
+                    if invalid <= 20:
+                        print(f'{path}: skipped {error}', file=out)
+                if len(batch) >= chunk_size:
+                    flush(batch)
+                    batch = []
+            if batch:
+                flush(batch)
+    finally:
+        for sql in DEFERRED_INDEXES.values():
+            conn.execute(sql)
+        conn.execute(f'''INSERT INTO questions_fts (rowid, {SEARCH_COLUMNS})
+                         SELECT id, {SEARCH_COLUMNS} FROM questions WHERE id > ?''', (last_id,))
+        for sql in SEARCH_TRIGGERS.values():
+            conn.execute(sql)
+        conn.commit()
+        conn.execute('PRAGMA synchronous = NORMAL')
+
+    elapsed = time.perf_counter() - started
+    processed = inserted + duplicates + invalid
+    rate = processed / elapsed if elapsed else 0
+    print(f'Imported {inserted} questions ({duplicates} duplicates, {invalid} invalid) '
+          f'in {elapsed:.2f}s, {rate:,.0f} rows/sec', file=out)
+    return inserted, duplicates, invalid
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk import questions from CSV or JSON Lines files.')
+    parser.add_argument('files', nargs='+', help='CSV (.csv) or JSON Lines files to import')
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help='override format detection by extension')
+    parser.add_argument('--chunk-size', type=int, default=10000, help='rows per transaction')
+    parser.add_argument('--db', default=DB_PATH, help='path to the SQLite database')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    conn.execute('PRAGMA journal_mode = WAL')
+    migrate(conn)
+    import_files(conn, args.files, args.format, args.chunk_size)
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
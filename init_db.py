@@ -1,12 +1,13 @@
 import sqlite3
 import os
 import werkzeug.security
+from config import DB_PATH
+from migrations import migrate
+from import_questions import INSERT_SQL, validate
 
-DB_PATH = os.path.join(os.path.dirname(__file__), 'database', 'quiz.db')
-
-def init_db():
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+def init_db(path=DB_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path)
     cursor = conn.cursor()
     
     # Create questions table
@@ -74,6 +75,9 @@ def init_db():
     )
     ''')
     
+    # Bring the schema (indexes, new columns and tables) up to date
+    migrate(conn)
+
     # Check if questions already exist to avoid duplicates
     cursor.execute('SELECT COUNT(*) FROM questions')
     if cursor.fetchone()[0] == 0:
@@ -146,7 +150,8 @@ def init_db():
             ("MTH101", "Given that A ⊂ B, simplify the expression (A ∩ B) ∪ (B \ A).", "A", "B", "A ∩ B", "A ∪ B", "B", "Given A ⊂ B, which means A is a subset of B. If A ⊂ B, then A ∩ B = A. Also, B \ A represents elements in B but not in A. The expression becomes A ∪ (B \ A). Since A and (B \ A) are disjoint (they have no common elements), their union is simply B. Alternatively, A ∪ (B \ A) = A ∪ (B ∩ A′). Using distributive law, this is (A ∪ B) ∩ (A ∪ A′) = (A ∪ B) ∩ U = A ∪ B. Since A ⊂ B, A ∪ B = B. So the simplified expression is B."),
         ]
         
-        cursor.executemany('INSERT INTO questions (course_code, question_text, option_a, option_b, option_c, option_d, correct_option, solution) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', questions)
+        fields = ('course_code', 'question_text', 'option_a', 'option_b', 'option_c', 'option_d', 'correct_option', 'solution')
+        cursor.executemany(INSERT_SQL, [validate(dict(zip(fields, q))) for q in questions])
     
     conn.commit()
     conn.close()
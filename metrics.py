@@ -0,0 +1,248 @@
+"""Per-request timing and SQL instrumentation.
+
+Enabled with METRICS_ENABLED=1. Each request's wall time is broken down into
+SQLite time and query count, template render time, external HTTP time and
+session (cookie) serialization time, then aggregated per endpoint and exposed
+in Prometheus text format on /metrics (loopback clients only). Statements
+slower than METRICS_SLOW_QUERY_MS are logged with their SQL text.
+
+When disabled nothing is registered: connections are db's untimed
+connections and no hooks run, so the overhead is nil.
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_app_context, request, before_render_template, template_rendered
+from flask.sessions import SecureCookieSessionInterface
+
+import db
+
+logger = logging.getLogger('cbt.metrics')
+
+ENABLED = os.getenv('METRICS_ENABLED', '').lower() in ('1', 'true', 'yes')
+SLOW_QUERY_SECONDS = float(os.getenv('METRICS_SLOW_QUERY_MS', 50)) / 1000
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COMPONENTS = ('db', 'render', 'external', 'session')
+
+
+class RequestTimings:
+    __slots__ = ('started', 'db', 'queries', 'render', 'external', 'session', '_render_started')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db = self.render = self.external = self.session = 0.0
+        self.queries = 0
+        self._render_started = None
+
+
+def _current():
+    if has_app_context():
+        return g.get('_timings')
+    return None
+
+
+def _record_query(sql, elapsed):
+    timings = _current()
+    if timings is not None:
+        timings.db += elapsed
+        timings.queries += 1
+    if elapsed >= SLOW_QUERY_SECONDS:
+        registry.slow_queries += 1
+        logger.warning('Slow query (%.1f ms): %s', elapsed * 1000, ' '.join(sql.split()))
+
+
+class TimedCursor(db.Cursor):
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _record_query(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _record_query(sql, time.perf_counter() - started)
+
+
+class TimedConnection(db.Connection):
+    """Connection whose statements are timed and attributed to the current request."""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+class TimedSessionInterface(SecureCookieSessionInterface):
+    def open_session(self, app, request):
+        # The session is opened before before_request hooks, so start the clock here
+        timings = g._timings = RequestTimings()
+        try:
+            return super().open_session(app, request)
+        finally:
+            timings.session += time.perf_counter() - timings.started
+
+    def save_session(self, app, session, response):
+        started = time.perf_counter()
+        try:
+            return super().save_session(app, session, response)
+        finally:
+            timings = _current()
+            if timings is not None:
+                timings.session += time.perf_counter() - started
+
+
+@contextmanager
+def track_external(name):
+    """Attribute the time spent in the block to external HTTP for this request."""
+    if not ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        timings = _current()
+        if timings is not None:
+            timings.external += elapsed
+        registry.observe_external(name, elapsed)
+
+
+class Registry:
+    """Process-wide aggregates, rendered in Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.routes = {}
+        self.external = {}
+        self.slow_queries = 0
+
+    def observe(self, endpoint, status, timings, total):
+        with self._lock:
+            route = self.routes.get(endpoint)
+            if route is None:
+                route = self.routes[endpoint] = {
+                    'count': 0, 'sum': 0.0, 'buckets': [0] * len(BUCKETS), 'queries': 0,
+                    'errors': 0, **{c: 0.0 for c in COMPONENTS}}
+            route['count'] += 1
+            route['sum'] += total
+            for i, bound in enumerate(BUCKETS):
+                if total <= bound:
+                    route['buckets'][i] += 1
+            route['queries'] += timings.queries
+            for component in COMPONENTS:
+                route[component] += getattr(timings, component)
+            if status >= 500:
+                route['errors'] += 1
+
+    def observe_external(self, name, elapsed):
+        with self._lock:
+            stats = self.external.setdefault(name, [0, 0.0])
+            stats[0] += 1
+            stats[1] += elapsed
+
+    def render(self, extra=()):
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        with self._lock:
+            routes = {k: dict(v, buckets=list(v['buckets'])) for k, v in self.routes.items()}
+            external = {k: list(v) for k, v in self.external.items()}
+            slow_queries = self.slow_queries
+
+        family('cbt_request_duration_seconds', 'histogram', 'Request wall time by endpoint.')
+        for endpoint, route in sorted(routes.items()):
+            label = f'endpoint="{endpoint}"'
+            for bound, count in zip(BUCKETS, route['buckets']):
+                lines.append(f'cbt_request_duration_seconds_bucket{{{label},le="{bound}"}} {count}')
+            lines.append(f'cbt_request_duration_seconds_bucket{{{label},le="+Inf"}} {route["count"]}')
+            lines.append(f'cbt_request_duration_seconds_sum{{{label}}} {route["sum"]:.6f}')
+            lines.append(f'cbt_request_duration_seconds_count{{{label}}} {route["count"]}')
+        for component in COMPONENTS:
+            name = f'cbt_request_{component}_seconds_total'
+            family(name, 'counter', f'Time spent in {component} while serving requests, by endpoint.')
+            for endpoint, route in sorted(routes.items()):
+                lines.append(f'{name}{{endpoint="{endpoint}"}} {route[component]:.6f}')
+        family('cbt_request_db_queries_total', 'counter', 'SQL statements executed, by endpoint.')
+        for endpoint, route in sorted(routes.items()):
+            lines.append(f'cbt_request_db_queries_total{{endpoint="{endpoint}"}} {route["queries"]}')
+        family('cbt_request_errors_total', 'counter', 'Responses with a 5xx status, by endpoint.')
+        for endpoint, route in sorted(routes.items()):
+            lines.append(f'cbt_request_errors_total{{endpoint="{endpoint}"}} {route["errors"]}')
+        family('cbt_external_http_seconds_total', 'counter', 'Time spent waiting on external HTTP services.')
+        for name, (count, total) in sorted(external.items()):
+            lines.append(f'cbt_external_http_seconds_total{{service="{name}"}} {total:.6f}')
+        family('cbt_external_http_requests_total', 'counter', 'Calls made to external HTTP services.')
+        for name, (count, total) in sorted(external.items()):
+            lines.append(f'cbt_external_http_requests_total{{service="{name}"}} {count}')
+        family('cbt_slow_queries_total', 'counter', 'SQL statements slower than the slow query threshold.')
+        lines.append(f'cbt_slow_queries_total {slow_queries}')
+        for name, kind, help_text, value in extra:
+            family(name, kind, help_text)
+            lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def init_app(app, extra_metrics=None):
+    """Install the hooks and the /metrics endpoint when METRICS_ENABLED is set.
+
+    `extra_metrics` is an optional callable returning (name, type, help, value)
+    tuples to append to the output.
+    """
+    if not ENABLED:
+        return
+
+    db.connection_factory = TimedConnection
+    app.session_interface = TimedSessionInterface()
+
+    @app.after_request
+    def record_status(response):
+        g._status = response.status_code
+        return response
+
+    @app.teardown_request
+    def observe_request(exception=None):
+        # Runs after the session cookie has been saved, so the total includes it
+        timings = g.pop('_timings', None)
+        if timings is None or request.endpoint == 'metrics':
+            return
+        status = 500 if exception else g.pop('_status', 500)
+        registry.observe(request.endpoint or 'unknown', status, timings, time.perf_counter() - timings.started)
+
+    def render_started(sender, template, context, **extra):
+        timings = _current()
+        if timings is not None:
+            timings._render_started = time.perf_counter()
+
+    def render_finished(sender, template, context, **extra):
+        timings = _current()
+        if timings is not None and timings._render_started is not None:
+            timings.render += time.perf_counter() - timings._render_started
+            timings._render_started = None
+
+    before_render_template.connect(render_started, app, weak=False)
+    template_rendered.connect(render_finished, app, weak=False)
+
+    @app.route('/metrics')
+    def metrics():
+        if request.remote_addr not in ('127.0.0.1', '::1'):
+            return 'Forbidden\n', 403
+        extra = extra_metrics() if extra_metrics else ()
+        return registry.render(extra), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
@@ -0,0 +1,294 @@
+"""Versioned schema migrations for the quiz database.
+
+The schema version is stored in `PRAGMA user_version`. Each migration runs in
+its own transaction and bumps the version, so an existing `database/quiz.db`
+is evolved in place and re-running is a no-op.
+
+Usage:
+    python migrations.py            # apply pending migrations
+    python migrations.py --explain  # only print query plans of hot statements
+"""
+import argparse
+import sqlite3
+
+from config import DB_PATH
+
+
+def backfill_question_hashes(conn):
+    """Fill questions.content_hash; later duplicates of a question keep NULL so the unique index builds."""
+    from import_questions import question_hash
+    seen = set()
+    updates = []
+    rows = conn.execute('SELECT id, course_code, question_text, option_a, option_b, option_c, option_d FROM questions ORDER BY id')
+    for row in rows:
+        digest = question_hash(*row[1:])
+        if digest not in seen:
+            seen.add(digest)
+            updates.append((digest, row[0]))
+    conn.executemany('UPDATE questions SET content_hash = ? WHERE id = ?', updates)
+
+
+# Keep questions_fts in step with questions; the importer drops these during a bulk load
+SEARCH_COLUMNS = 'course_code, question_text, option_a, option_b, option_c, option_d, solution'
+_NEW = ', '.join(f'new.{column}' for column in SEARCH_COLUMNS.split(', '))
+_OLD = ', '.join(f'old.{column}' for column in SEARCH_COLUMNS.split(', '))
+SEARCH_TRIGGERS = {
+    'questions_fts_insert': f'''CREATE TRIGGER IF NOT EXISTS questions_fts_insert AFTER INSERT ON questions BEGIN
+        INSERT INTO questions_fts (rowid, {SEARCH_COLUMNS})
+        VALUES (new.id, {_NEW});
+    END''',
+    'questions_fts_delete': f'''CREATE TRIGGER IF NOT EXISTS questions_fts_delete AFTER DELETE ON questions BEGIN
+        INSERT INTO questions_fts (questions_fts, rowid, {SEARCH_COLUMNS})
+        VALUES ('delete', old.id, {_OLD});
+    END''',
+    'questions_fts_update': f'''CREATE TRIGGER IF NOT EXISTS questions_fts_update
+        AFTER UPDATE OF {SEARCH_COLUMNS} ON questions BEGIN
+        INSERT INTO questions_fts (questions_fts, rowid, {SEARCH_COLUMNS})
+        VALUES ('delete', old.id, {_OLD});
+        INSERT INTO questions_fts (rowid, {SEARCH_COLUMNS})
+        VALUES (new.id, {_NEW});
+    END''',
+}
+
+# (version, description, statements); a statement may also be a callable taking the connection
+MIGRATIONS = [
+    (1, 'Indexes for course, payment and score lookups', [
+        'CREATE INDEX IF NOT EXISTS idx_questions_course ON questions (course_code, id)',
+        'CREATE INDEX IF NOT EXISTS idx_payments_user_status ON payments (user_id, status)',
+        'CREATE INDEX IF NOT EXISTS idx_scores_user ON scores (user_id, created_at)',
+    ]),
+    (2, 'Materialized score ratio for the leaderboard', [
+        'ALTER TABLE scores ADD COLUMN ratio REAL',
+        'UPDATE scores SET ratio = CAST(score AS REAL) / total',
+        'CREATE INDEX IF NOT EXISTS idx_scores_ratio ON scores (ratio DESC, created_at DESC)',
+        'CREATE INDEX IF NOT EXISTS idx_scores_course_ratio ON scores (course_code, ratio DESC, created_at DESC)',
+        'CREATE INDEX IF NOT EXISTS idx_scores_created ON scores (created_at)',
+    ]),
+    (3, 'Question bank version counter for cache invalidation', [
+        'CREATE TABLE IF NOT EXISTS bank_version (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)',
+        'INSERT OR IGNORE INTO bank_version (id, version) VALUES (1, 0)',
+        '''CREATE TRIGGER IF NOT EXISTS questions_bump_version_insert AFTER INSERT ON questions
+           BEGIN UPDATE bank_version SET version = version + 1 WHERE id = 1; END''',
+        '''CREATE TRIGGER IF NOT EXISTS questions_bump_version_update AFTER UPDATE ON questions
+           BEGIN UPDATE bank_version SET version = version + 1 WHERE id = 1; END''',
+        '''CREATE TRIGGER IF NOT EXISTS questions_bump_version_delete AFTER DELETE ON questions
+           BEGIN UPDATE bank_version SET version = version + 1 WHERE id = 1; END''',
+    ]),
+    (4, 'Server-side quiz attempt store', [
+        '''CREATE TABLE IF NOT EXISTS attempts (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER,
+            course_code TEXT NOT NULL,
+            simulator TEXT NOT NULL,
+            num_questions INTEGER,
+            duration_seconds INTEGER,
+            seed INTEGER,
+            answers TEXT,
+            score INTEGER,
+            total INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            submitted_at TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_attempts_user ON attempts (user_id, created_at)',
+    ]),
+    (5, 'Content hash for question deduplication', [
+        'ALTER TABLE questions ADD COLUMN content_hash TEXT',
+        backfill_question_hashes,
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_questions_hash ON questions (content_hash)',
+    ]),
+    (6, 'Attempt papers and append-only answer checkpoints', [
+        'ALTER TABLE attempts ADD COLUMN question_ids TEXT',
+        '''CREATE TABLE IF NOT EXISTS attempt_progress (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            attempt_id TEXT NOT NULL,
+            question_id INTEGER NOT NULL,
+            answer TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (attempt_id) REFERENCES attempts (id)
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_attempt_progress_attempt ON attempt_progress (attempt_id, id)',
+    ]),
+    (7, 'Scheduled sittings with pre-generated candidate papers', [
+        '''CREATE TABLE IF NOT EXISTS sittings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            course_code TEXT NOT NULL,
+            num_questions INTEGER NOT NULL,
+            duration_seconds INTEGER NOT NULL,
+            starts_at TIMESTAMP NOT NULL,
+            created_by INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (created_by) REFERENCES users (id)
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_sittings_starts ON sittings (starts_at)',
+        '''CREATE TABLE IF NOT EXISTS sitting_candidates (
+            sitting_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            attempt_id TEXT NOT NULL,
+            PRIMARY KEY (sitting_id, user_id)
+        ) WITHOUT ROWID''',
+    ]),
+    (8, 'Server-side attempt deadlines', [
+        'ALTER TABLE attempts ADD COLUMN deadline INTEGER',
+    ]),
+    (9, 'Answer event log and per-question aggregates', [
+        '''CREATE TABLE IF NOT EXISTS answer_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            attempt_id TEXT NOT NULL,
+            question_id INTEGER NOT NULL,
+            answer TEXT,
+            correct INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )''',
+        '''CREATE TABLE IF NOT EXISTS question_stats (
+            question_id INTEGER PRIMARY KEY,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            correct INTEGER NOT NULL DEFAULT 0,
+            option_a INTEGER NOT NULL DEFAULT 0,
+            option_b INTEGER NOT NULL DEFAULT 0,
+            option_c INTEGER NOT NULL DEFAULT 0,
+            option_d INTEGER NOT NULL DEFAULT 0,
+            skipped INTEGER NOT NULL DEFAULT 0
+        )''',
+        '''CREATE TABLE IF NOT EXISTS aggregator_state (
+            name TEXT PRIMARY KEY,
+            last_event_id INTEGER NOT NULL
+        )''',
+    ]),
+    (10, 'Per-user weakness index for adaptive selection', [
+        '''CREATE TABLE IF NOT EXISTS user_weakness (
+            user_id INTEGER NOT NULL,
+            course_code TEXT NOT NULL,
+            question_id INTEGER NOT NULL,
+            misses INTEGER NOT NULL,
+            PRIMARY KEY (user_id, course_code, question_id)
+        ) WITHOUT ROWID''',
+        # Seed from the answer log: net misses (misses minus correct answers) per question
+        '''INSERT INTO user_weakness (user_id, course_code, question_id, misses)
+           SELECT a.user_id, a.course_code, e.question_id, SUM(CASE WHEN e.correct THEN -1 ELSE 1 END)
+           FROM answer_events e JOIN attempts a ON a.id = e.attempt_id
+           WHERE a.user_id IS NOT NULL
+           GROUP BY a.user_id, a.course_code, e.question_id
+           HAVING SUM(CASE WHEN e.correct THEN -1 ELSE 1 END) > 0''',
+    ]),
+    (11, 'Full-text search index over questions', [
+        # External-content table: the index stores tokens only, the text stays in `questions`.
+        # course_code is indexed so a course filter is part of the MATCH, not a join
+        f'''CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts USING fts5(
+            {SEARCH_COLUMNS},
+            content='questions', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )''',
+        *SEARCH_TRIGGERS.values(),
+        "INSERT INTO questions_fts (questions_fts) VALUES ('rebuild')",
+        # Default ranking: question text over options over solution; the course never scores
+        "INSERT INTO questions_fts (questions_fts, rank) VALUES ('rank', 'bm25(0.0, 4.0, 2.0, 2.0, 2.0, 2.0, 1.0)')",
+    ]),
+    (12, 'Attempt selection mode and abandonment', [
+        "ALTER TABLE attempts ADD COLUMN selection TEXT NOT NULL DEFAULT 'random'",
+        'ALTER TABLE attempts ADD COLUMN abandoned_at TIMESTAMP',
+    ]),
+    (13, 'Sitting paper lookup by attempt', [
+        'CREATE INDEX IF NOT EXISTS idx_sitting_candidates_attempt ON sitting_candidates (attempt_id)',
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+# Statements on the request path, with representative parameters
+HOT_QUERIES = [
+    ('question ids for course', 'SELECT id FROM questions WHERE course_code = ? ORDER BY id', ('MTH101',)),
+    ('course codes', 'SELECT DISTINCT course_code FROM questions ORDER BY course_code', ()),
+    ('question count for course', 'SELECT COUNT(*) FROM questions WHERE course_code = ?', ('MTH101',)),
+    ('paid entitlement', 'SELECT status FROM payments WHERE user_id = ? AND status = \'paid\'', (1,)),
+    ('scores for user', 'SELECT score, total FROM scores WHERE user_id = ? ORDER BY created_at DESC', (1,)),
+    ('leaderboard', '''SELECT s.*, u.username FROM scores s JOIN users u ON s.user_id = u.id
+        ORDER BY s.ratio DESC, s.created_at DESC LIMIT 10''', ()),
+    ('sitting paper', 'SELECT attempt_id FROM sitting_candidates WHERE sitting_id = ? AND user_id = ?', (1, 1)),
+    ('attempt in sitting', 'SELECT 1 FROM sitting_candidates WHERE attempt_id = ?', ('x',)),
+    ('weak questions for user', '''SELECT question_id, misses FROM user_weakness
+        WHERE user_id = ? AND course_code = ? AND misses > 0 ORDER BY misses DESC LIMIT 200''', (1, 'MTH101')),
+    ('search term frequency', '''SELECT count(*) FROM (SELECT rowid FROM questions_fts WHERE questions_fts MATCH ?
+        LIMIT 501)''', ('"derivative"',)),
+    ('ranked question search', '''SELECT f.rowid FROM questions_fts f JOIN questions q ON q.id = f.rowid
+        WHERE questions_fts MATCH ? AND q.course_code = ? ORDER BY f.rank LIMIT 21 OFFSET 0''',
+        ('{question_text option_a option_b option_c option_d} : ("chain" "rul"*)', 'MTH101')),
+    ('question search', '''SELECT rowid FROM questions_fts WHERE questions_fts MATCH ?
+        ORDER BY rowid DESC LIMIT 21 OFFSET 0''', ('{question_text option_a option_b option_c option_d} : ("deriv"*) AND course_code : "MTH101"',)),
+    ('course leaderboard', '''SELECT s.*, u.username FROM scores s JOIN users u ON s.user_id = u.id
+        WHERE s.course_code = ? ORDER BY s.ratio DESC, s.created_at DESC LIMIT 10''', ('MTH101',)),
+]
+
+
+def current_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def query_plans(conn):
+    """Return {name: plan} for every hot statement."""
+    plans = {}
+    for name, sql, params in HOT_QUERIES:
+        try:
+            rows = conn.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+            plans[name] = '; '.join(row[-1] for row in rows)
+        except sqlite3.OperationalError as e:
+            plans[name] = f'unavailable ({e})'
+    return plans
+
+
+def migrate(conn, verbose=False):
+    """Apply all pending migrations and return the resulting schema version."""
+    version = current_version(conn)
+    pending = [m for m in MIGRATIONS if m[0] > version]
+    if not pending:
+        return version
+
+    before = query_plans(conn) if verbose else None
+    for number, description, statements in pending:
+        # Explicit BEGIN so DDL and data changes commit or roll back together
+        conn.commit()
+        conn.execute('BEGIN')
+        try:
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {number}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        if verbose:
+            print(f'Applied migration {number}: {description}')
+    conn.execute('ANALYZE')
+
+    if verbose:
+        after = query_plans(conn)
+        for name, _, _ in HOT_QUERIES:
+            if before[name] != after[name]:
+                print(f'  {name}:\n    before: {before[name]}\n    after:  {after[name]}')
+            else:
+                print(f'  {name}: unchanged ({after[name]})')
+    return current_version(conn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Apply schema migrations to the quiz database.')
+    parser.add_argument('--db', default=DB_PATH, help='path to the SQLite database')
+    parser.add_argument('--explain', action='store_true', help='print query plans without migrating')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    if args.explain:
+        print(f'Schema version {current_version(conn)}')
+        for name, plan in query_plans(conn).items():
+            print(f'  {name}: {plan}')
+    else:
+        version = migrate(conn, verbose=True)
+        print(f'Database is at schema version {version}.')
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
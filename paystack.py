@@ -0,0 +1,70 @@
+from urllib.parse import quote
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, MaxRetryError, NewConnectionError, ReadTimeoutError
+from urllib3.util.retry import Retry
+
+PAYSTACK_BASE_URL = 'https://api.paystack.co'
+
+
+class PaystackError(Exception):
+    """Raised when Paystack cannot be reached or returns an unusable response."""
+
+
+class PaystackClient:
+    """Keep-alive HTTP client for the Paystack API.
+
+    One `requests.Session` is shared per worker so verifications reuse pooled
+    TLS connections. Every call is bounded by connect/read timeouts, and
+    idempotent GETs are retried with exponential backoff on connection errors
+    and 429/5xx responses. A read timeout is never retried, so the worst case
+    stays near `read_timeout` plus the connect attempts (about 20 s by
+    default), inside gunicorn's worker timeout. `base_url` can point at a
+    local stub server.
+    """
+
+    def __init__(self, secret_key, base_url=PAYSTACK_BASE_URL, connect_timeout=3.05, read_timeout=10,
+                 retries=2, backoff_factor=0.5, pool_size=10):
+        self.secret_key = secret_key
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        retry = Retry(
+            total=retries,
+            read=0,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET']),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers['Authorization'] = f'Bearer {secret_key}'
+
+    def verify_transaction(self, reference):
+        """Return Paystack's verify response for a transaction reference as a dict."""
+        url = f'{self.base_url}/transaction/verify/{quote(reference, safe="")}'
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+            return response.json()
+        except ValueError as e:
+            # Includes requests' JSONDecodeError, which is also a RequestException
+            raise PaystackError('Payment gateway returned an invalid response. Please try again.') from e
+        except requests.RequestException as e:
+            if _timed_out(e):
+                raise PaystackError('Payment gateway timed out. Please try again.') from e
+            raise PaystackError('Could not reach payment gateway. Please try again.') from e
+
+
+def _timed_out(error):
+    """True for a timeout, including one that ended the retries (requests reports those as ConnectionError)."""
+    if isinstance(error, requests.Timeout):
+        return True
+    reason = error.args[0] if error.args else None
+    if not isinstance(reason, MaxRetryError):
+        return False
+    # urllib3 makes a refused connection a subclass of ConnectTimeoutError
+    cause = reason.reason
+    return isinstance(cause, (ReadTimeoutError, ConnectTimeoutError)) and not isinstance(cause, NewConnectionError)
@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import namedtuple
+
+from db import fetch_by_ids
+
+# Compact per-question record held in memory
+Question = namedtuple('Question', [
+    'id', 'course_code', 'question_text', 'option_a', 'option_b', 'option_c', 'option_d',
+    'correct_option', 'solution',
+])
+
+COLUMNS = ', '.join(Question._fields)
+
+
+class QuestionBank:
+    """Read-through, in-memory cache of the question bank keyed by course code.
+
+    Triggers on `questions` bump `bank_version.version` on every insert,
+    update or delete. The cache compares that counter at most once every
+    `check_interval` seconds and drops everything when it has moved, so
+    edits made by any process show up without a restart.
+    """
+
+    def __init__(self, check_interval=1.0):
+        self.check_interval = check_interval
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._checked_at = 0.0
+        self._courses = {}
+        self._by_id = {}
+        self._codes = None
+        self._lock = threading.Lock()
+
+    def _sync(self, conn):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        row = conn.execute('SELECT version FROM bank_version WHERE id = 1').fetchone()
+        version = row[0] if row else 0
+        with self._lock:
+            if version != self.version:
+                self._courses = {}
+                self._by_id = {}
+                self._codes = None
+                self.version = version
+            self._checked_at = now
+
+    def _load_course(self, conn, course):
+        rows = conn.execute(f'SELECT {COLUMNS} FROM questions WHERE course_code = ? ORDER BY id', (course,))
+        questions = tuple(Question(*row) for row in rows)
+        with self._lock:
+            self._courses[course] = questions
+            self._by_id.update((q.id, q) for q in questions)
+        return questions
+
+    def course(self, conn, course):
+        """Return every question in a course, ordered by id."""
+        self._sync(conn)
+        questions = self._courses.get(course)
+        if questions is not None:
+            self.hits += 1
+            return questions
+        self.misses += 1
+        return self._load_course(conn, course)
+
+    def course_ids(self, conn, course):
+        return [q.id for q in self.course(conn, course)]
+
+    def count(self, conn, course):
+        return len(self.course(conn, course))
+
+    def course_codes(self, conn):
+        """Return the sorted list of distinct course codes."""
+        self._sync(conn)
+        codes = self._codes
+        if codes is not None:
+            self.hits += 1
+            return codes
+        self.misses += 1
+        codes = [row[0] for row in conn.execute('SELECT DISTINCT course_code FROM questions ORDER BY course_code')]
+        self._codes = codes
+        return codes
+
+    def get_many(self, conn, ids):
+        """Return {id: Question} for the given ids; unknown ids are left out.
+
+        Ids outside the cached courses cause their whole course to be loaded,
+        since a paper's questions nearly always come from a single course.
+        """
+        self._sync(conn)
+        by_id = self._by_id
+        found = {i: by_id[i] for i in ids if i in by_id}
+        missing = [i for i in ids if i is not None and i not in found]
+        if not missing:
+            self.hits += 1
+            return found
+        self.misses += 1
+        rows = fetch_by_ids(conn, 'questions', ['course_code'], missing)
+        for course in {row['course_code'] for row in rows.values()}:
+            for q in self._load_course(conn, course):
+                if q.id in rows:
+                    found[q.id] = q
+        return found
+
+    def stats(self):
+        return {'version': self.version, 'hits': self.hits, 'misses': self.misses,
+                'courses': len(self._courses), 'questions': len(self._by_id)}
+
+
+question_bank = QuestionBank()
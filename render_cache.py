@@ -0,0 +1,66 @@
+import hashlib
+import threading
+from functools import wraps
+
+from flask import make_response, request, session
+
+
+class RenderCache:
+    """Caches the rendered HTML of pages that only vary on login state.
+
+    Cached responses carry a strong ETag, so browsers revalidate with
+    If-None-Match and get a 304 without a body. Only use it for pages whose
+    templates do not render flash messages, since a cached page would never
+    consume them. Templates only change on deploy, which restarts the workers and empties
+    the cache.
+    """
+
+    def __init__(self):
+        self._pages = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name):
+        return name, 'user_id' in session
+
+    def render(self, name, view, *args, **kwargs):
+        """Return (body, status, etag) for a view, rendering it only on a miss.
+
+        Redirects are returned as a response object and never cached.
+        """
+        key = self._key(name)
+        page = self._pages.get(key)
+        if page is None:
+            response = make_response(view(*args, **kwargs))
+            if 300 <= response.status_code < 400:
+                return response
+            body = response.get_data()
+            page = (body, response.status_code, hashlib.sha1(body).hexdigest())
+            with self._lock:
+                self._pages[key] = page
+        return page
+
+    def cached_page(self, view):
+        """Decorator for views whose output depends only on login state."""
+        @wraps(view)
+        def decorated_function(*args, **kwargs):
+            page = self.render(view.__name__, view, *args, **kwargs)
+            if not isinstance(page, tuple):
+                return page
+            body, status, etag = page
+            response = make_response(body, status)
+            response.vary.add('Cookie')
+            if status != 200:
+                return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response.make_conditional(request)
+        return decorated_function
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+
+
+render_cache = RenderCache()
+cached_page = render_cache.cached_page
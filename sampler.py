@@ -0,0 +1,17 @@
+import random
+import secrets
+
+
+def sample_paper(questions, limit=None, seed=None):
+    """Return (seed, questions) for a uniform random draw of up to `limit` questions.
+
+    Replaces `ORDER BY RANDOM()`, which scans and sorts a whole course on every
+    quiz start. `questions` is a course from the in-memory question bank,
+    ordered by id, so passing the returned seed back in reproduces the same
+    draw. Without a limit the whole course is returned in shuffled order.
+    """
+    if seed is None:
+        seed = secrets.randbits(32)
+    rng = random.Random(seed)
+    k = len(questions) if not limit or limit < 0 else min(limit, len(questions))
+    return seed, rng.sample(questions, k)
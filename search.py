@@ -0,0 +1,187 @@
+"""Full-text search over the question bank.
+
+`questions_fts` is an FTS5 index over the course code, question text, options
+and solution. It is an external-content table, so the text is stored once in
+`questions` and the index only holds tokens; triggers keep it in step with
+every insert, update and delete. Prefix indexes on 2 and 3 characters serve
+the short prefixes of search-as-you-type without walking the term list.
+
+User input is never passed to MATCH as query syntax: each word becomes a
+quoted term and the last one a prefix, so `x^2 + "quoted" OR` cannot raise
+a syntax error or turn into an operator.
+
+bm25 has to walk the full posting list of every term (and of the course
+filter, were it part of the MATCH), so a query is only ranked by relevance
+when no term appears in more than COMMON_TERM_DOCS questions; the ranked
+query filters by course through `questions` instead. Anything broader (a
+common word, or a short prefix while typing) is listed newest first from a
+bounded index scan; the response says which with `ranked`. Either way
+results stop after RESULT_WINDOW. Stopwords are dropped because they match
+nearly every row.
+"""
+import re
+import unicodedata
+
+PER_PAGE = 20
+MAX_PER_PAGE = 50
+MAX_TERMS = 8
+RESULT_WINDOW = 1000
+# Questions a term may appear in for the query still to be ranked
+COMMON_TERM_DOCS = 500
+# Shortest last word searched as a prefix, and the longest one served by a
+# prefix index; matches the table's prefix='2 3'
+MIN_PREFIX = 2
+MAX_INDEXED_PREFIX = 3
+SNIPPET_WORDS = 12
+# Columns free text is matched against; solutions only when answers are shown
+TEXT_COLUMNS = ('question_text', 'option_a', 'option_b', 'option_c', 'option_d')
+ANSWER_COLUMNS = TEXT_COLUMNS + ('solution',)
+STOPWORDS = frozenset('''
+    a an and are as at be by for from how in is it its of on or that the this to was what when which
+    who why will with
+'''.split())
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+def _fold(word):
+    """Lowercase and strip diacritics, like the index's unicode61 tokenizer."""
+    if word.isascii():
+        return word.lower()
+    decomposed = unicodedata.normalize('NFKD', word.lower())
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def _quote(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def query_terms(text):
+    """Return the words to search for; stopwords are dropped unless nothing else is left."""
+    words = [_fold(w) for w in _TOKEN.findall(text or '')][:MAX_TERMS]
+    if not words:
+        return []
+    terms = [w for w in words[:-1] if w not in STOPWORDS] + [words[-1]]
+    if len(terms) == 1 and terms[0] in STOPWORDS:
+        return words
+    return terms
+
+
+def _phrases(terms):
+    """Quoted FTS5 phrases for the terms; the last is a prefix, as it may still be typed."""
+    quoted = [_quote(term) for term in terms]
+    if len(terms[-1]) >= MIN_PREFIX:
+        quoted[-1] += '*'
+    return quoted
+
+
+def match_expression(terms, columns=TEXT_COLUMNS):
+    """FTS5 query requiring every term in `columns`."""
+    return f"{{{' '.join(columns)}}} : ({' '.join(_phrases(terms))})"
+
+
+def _common(conn, phrase):
+    count = conn.execute('SELECT count(*) FROM (SELECT rowid FROM questions_fts WHERE questions_fts MATCH ? LIMIT ?)',
+                         (phrase, COMMON_TERM_DOCS + 1)).fetchone()[0]
+    return count > COMMON_TERM_DOCS
+
+
+def common_terms(conn, terms):
+    """Whether any term appears in more than COMMON_TERM_DOCS questions (in any column).
+
+    A term's posting list is read lazily, so each check stops after
+    COMMON_TERM_DOCS + 1 rowids however common the term is. A prefix longer
+    than the prefix indexes is merged from every term it covers before the
+    first row comes back, so it is bounded from both sides first: it is
+    common if the whole word is, and rare if its indexed prefix is.
+    """
+    phrases = _phrases(terms)
+    if any(_common(conn, phrase) for phrase in phrases[:-1]):
+        return True
+    last = terms[-1]
+    if len(last) > MAX_INDEXED_PREFIX:
+        if _common(conn, _quote(last)):
+            return True
+        if not _common(conn, _quote(last[:MAX_INDEXED_PREFIX]) + '*'):
+            return False
+    return _common(conn, phrases[-1])
+
+
+def snippet(row, terms, columns=TEXT_COLUMNS, words=SNIPPET_WORDS):
+    """Plain-text excerpt of the first column that matches, with matched words in [ ]."""
+    last = terms[-1] if len(terms[-1]) >= MIN_PREFIX else None
+    exact = set(terms if last is None else terms[:-1])
+
+    def matches(word):
+        word = _fold(word)
+        return word in exact or (last is not None and word.startswith(last))
+
+    # Folding ASCII is lowercasing, so a case-insensitive search rules out most columns without tokenizing them
+    hit = re.compile('|'.join([rf'\b{re.escape(term)}\b' for term in exact]
+                              + ([rf'\b{re.escape(last)}'] if last is not None else [])), re.IGNORECASE)
+    for column in columns:
+        text = row.get(column) or ''
+        if text.isascii() and not hit.search(text):
+            continue
+        tokens = _TOKEN.findall(text)
+        hits = [i for i, token in enumerate(tokens) if matches(token)]
+        if hits:
+            start = max(0, min(hits[0] - words // 3, len(tokens) - words))
+            shown = [f'[{t}]' if matches(t) else t for t in tokens[start:start + words]]
+            return ('…' if start else '') + ' '.join(shown) + ('…' if start + words < len(tokens) else '')
+    return ''
+
+
+def search(conn, text, course=None, page=1, per_page=PER_PAGE, with_answers=False):
+    """Return one page of matches as {'results', 'page', 'per_page', 'has_more', 'ranked'}.
+
+    The page is fetched with one extra row to tell whether another follows,
+    so no COUNT over the whole match set is needed.
+    """
+    page = max(1, page)
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
+    empty = {'results': [], 'page': page, 'per_page': per_page, 'has_more': False, 'ranked': True}
+    terms = query_terms(text)
+    offset = (page - 1) * per_page
+    if not terms or offset >= RESULT_WINDOW:
+        return empty
+    columns = ANSWER_COLUMNS if with_answers else TEXT_COLUMNS
+    expression = match_expression(terms, columns)
+
+    ranked = not common_terms(conn, terms)
+    if ranked and course:
+        # Every term is rare, so the whole match set is small; filtering it through
+        # `questions` keeps the course's long posting list out of bm25
+        ids = [row[0] for row in conn.execute('''
+            SELECT f.rowid FROM questions_fts f JOIN questions q ON q.id = f.rowid
+            WHERE questions_fts MATCH ? AND q.course_code = ? ORDER BY f.rank LIMIT ? OFFSET ?
+        ''', (expression, course, per_page + 1, offset))]
+    elif ranked:
+        ids = [row[0] for row in conn.execute(
+            'SELECT rowid FROM questions_fts WHERE questions_fts MATCH ? ORDER BY rank LIMIT ? OFFSET ?',
+            (expression, per_page + 1, offset))]
+    else:
+        # Filtering on the indexed course column keeps the course restriction inside the index
+        if course:
+            expression += f' AND course_code : {_quote(course)}'
+        ids = [row[0] for row in conn.execute(
+            'SELECT rowid FROM questions_fts WHERE questions_fts MATCH ? ORDER BY rowid DESC LIMIT ? OFFSET ?',
+            (expression, per_page + 1, offset))]
+    has_more = len(ids) > per_page and offset + per_page < RESULT_WINDOW
+    ids = ids[:per_page]
+    if not ids:
+        return dict(empty, ranked=ranked)
+
+    rows = {row['id']: dict(row) for row in conn.execute(f'''
+        SELECT id, course_code, question_text, option_a, option_b, option_c, option_d, correct_option, solution
+        FROM questions WHERE id IN ({', '.join('?' * len(ids))})
+    ''', ids)}
+    results = []
+    for question_id in ids:
+        row = rows.get(question_id)
+        if row is None:
+            continue
+        row['snippet'] = snippet(row, terms, columns)
+        if not with_answers:
+            del row['correct_option'], row['solution']
+        results.append(row)
+    return dict(empty, results=results, has_more=has_more, ranked=ranked)
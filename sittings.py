@@ -0,0 +1,112 @@
+"""Scheduled exam sittings with papers drawn ahead of time.
+
+An organizer schedules a sitting (course, paper size, duration, start time)
+and enrolls candidates. Each candidate's paper is drawn at enrollment and
+stored as a ready-made attempt, so when a whole class starts at once,
+opening the exam is one primary-key read per candidate. It does no sampling
+and no writes.
+
+Times are stored in UTC, in the same format as CURRENT_TIMESTAMP. Organizers
+enter them in SITTING_TIMEZONE (default Africa/Lagos).
+"""
+import json
+import os
+import secrets
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from sampler import sample_paper
+
+SITTING_TIMEZONE = ZoneInfo(os.getenv('SITTING_TIMEZONE', 'Africa/Lagos'))
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def parse_local(text):
+    """Parse an organizer's `YYYY-MM-DDTHH:MM` input into a UTC timestamp string."""
+    local = datetime.fromisoformat(text).replace(tzinfo=SITTING_TIMEZONE)
+    return local.astimezone(timezone.utc).strftime(TIMESTAMP_FORMAT)
+
+
+def _utc(timestamp):
+    return datetime.strptime(timestamp, TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc)
+
+
+def local_time(timestamp):
+    """Format a stored UTC timestamp in the sitting timezone."""
+    return _utc(timestamp).astimezone(SITTING_TIMEZONE).strftime('%a %d %b %Y, %H:%M')
+
+
+def window(sitting):
+    """Return the (start, end) datetimes of a sitting."""
+    start = _utc(sitting['starts_at'])
+    return start, start + timedelta(seconds=sitting['duration_seconds'])
+
+
+def state(sitting, now=None):
+    """Return 'scheduled', 'open' or 'closed' for a sitting."""
+    now = now or datetime.now(timezone.utc)
+    start, end = window(sitting)
+    if now < start:
+        return 'scheduled'
+    return 'open' if now < end else 'closed'
+
+
+def create_sitting(conn, course, num_questions, duration_seconds, starts_at, created_by):
+    """Schedule a sitting and return its id."""
+    cursor = conn.execute('''
+        INSERT INTO sittings (course_code, num_questions, duration_seconds, starts_at, created_by)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (course, num_questions, duration_seconds, starts_at, created_by))
+    conn.commit()
+    return cursor.lastrowid
+
+
+def get_sitting(conn, sitting_id):
+    row = conn.execute('SELECT * FROM sittings WHERE id = ?', (sitting_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def list_sittings(conn, limit=50):
+    """Most recent sittings first, with their candidate counts."""
+    rows = conn.execute('''
+        SELECT s.*, (SELECT COUNT(*) FROM sitting_candidates c WHERE c.sitting_id = s.id) AS candidates
+        FROM sittings s ORDER BY s.starts_at DESC LIMIT ?
+    ''', (limit,))
+    return [dict(row) for row in rows]
+
+
+def enroll(conn, sitting, user_ids, questions):
+    """Draw a paper for each new candidate and store it as an unstarted attempt.
+
+    `questions` is the sitting's course from the question bank. Candidates
+    already enrolled keep their paper. Returns the number newly enrolled.
+    """
+    enrolled = {row[0] for row in conn.execute(
+        'SELECT user_id FROM sitting_candidates WHERE sitting_id = ?', (sitting['id'],))}
+    # Every candidate's attempt ends when the sitting does
+    deadline = int(window(sitting)[1].timestamp())
+    attempts, candidates = [], []
+    for user_id in dict.fromkeys(user_ids):
+        if user_id in enrolled:
+            continue
+        seed, paper = sample_paper(questions, sitting['num_questions'])
+        attempt_id = secrets.token_urlsafe(16)
+        question_ids = json.dumps([q.id for q in paper], separators=(',', ':'))
+        attempts.append((attempt_id, user_id, sitting['course_code'], 'paid', len(paper),
+                         sitting['duration_seconds'], seed, question_ids, deadline))
+        candidates.append((sitting['id'], user_id, attempt_id))
+    conn.executemany('''
+        INSERT INTO attempts (id, user_id, course_code, simulator, num_questions, duration_seconds, seed,
+                              question_ids, deadline)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', attempts)
+    conn.executemany('INSERT INTO sitting_candidates (sitting_id, user_id, attempt_id) VALUES (?, ?, ?)', candidates)
+    conn.commit()
+    return len(candidates)
+
+
+def candidate_attempt(conn, sitting_id, user_id):
+    """Return the id of the candidate's pre-generated attempt, or None if not enrolled."""
+    row = conn.execute('SELECT attempt_id FROM sitting_candidates WHERE sitting_id = ? AND user_id = ?',
+                       (sitting_id, user_id)).fetchone()
+    return row[0] if row else None